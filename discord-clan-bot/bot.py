@@ -1,17 +1,41 @@
 import discord
 from discord.ext import commands, tasks
 import logging
-from datetime import datetime
-import asyncio
+import hashlib
+import json
+from datetime import time
 from typing import Optional
 from config import Config
 from database import DatabaseManager
 from notifications import NotificationManager
-from utils import safe_log_message
+from utils import parse_sheet_datetime, local_now
 
 # Note: Logging is configured in utils.setup_logging() called from main.py
 logger = logging.getLogger(__name__)
 
+# Digest of the last command tree pushed to Discord, used to skip redundant syncs
+COMMAND_DIGEST_PATH = './logs/.cmd_digest'
+
+def _error_embed(description: str, title: str = "❌ Terjadi Kesalahan") -> discord.Embed:
+    """Build a red error embed"""
+    return discord.Embed(title=title, description=description, color=discord.Color.red())
+
+# Static embeds are built once and reused; they are never mutated after creation
+_ERROR_EMBED_GENERIC = _error_embed("Maaf, terjadi kesalahan sistem. Silakan coba lagi nanti.")
+_ERROR_EMBED_FETCH = _error_embed("Maaf, terjadi kesalahan saat mengambil data. Silakan coba lagi nanti.")
+_ERROR_EMBED_CHECK = _error_embed("Maaf, terjadi kesalahan saat mengecek item. Silakan coba lagi nanti.")
+_ERROR_EMBED_STATUS = _error_embed("Maaf, terjadi kesalahan saat mengecek status. Silakan coba lagi nanti.")
+_ADD_FAILED_EMBED = _error_embed("Terjadi kesalahan saat menyimpan item. Silakan coba lagi.", "❌ Gagal Menambahkan Item")
+_INVALID_TYPE_EMBED = _error_embed(
+    f"Tipe harus salah satu dari: {', '.join(Config.ITEM_TYPE_ORDER)}", "❌ Tipe Item Tidak Valid"
+)
+_ACCESS_DENIED_EMBED = _error_embed("Anda tidak memiliki izin untuk menggunakan command ini.", "🚫 Akses Ditolak")
+_EMPTY_STORAGE_EMBED = discord.Embed(
+    title="📭 Storage Kosong",
+    description="Belum ada item yang tersimpan di storage clan.",
+    color=discord.Color.orange()
+)
+
 class ClanStorageBot(commands.Bot):
     def __init__(self):
         # Configure intents - only use what we need for slash commands
@@ -25,57 +49,65 @@ class ClanStorageBot(commands.Bot):
     
     async def setup_hook(self):
         """Initialize bot setup"""
+        # Logs directory and config validation are handled before the loop starts
+        # (utils.setup_logging / Config.validate in main.py or the __main__ block below)
         try:
-            # Create logs directory
-            import os
-            os.makedirs('./logs', exist_ok=True)
-            
-            # Validate configuration
-            Config.validate()
-            
             # Start background tasks
             self.check_expiring_items.start()
             
             # Sync slash commands
-            await self.tree.sync()
-            logger.info(safe_log_message(
-                "✅ Slash commands synced",
-                "Slash commands synced"
-            ))
+            if await self._sync_commands_if_changed():
+                logger.info("✅ Slash commands synced")
+            else:
+                logger.info("✅ Slash commands unchanged, sync skipped")
             
         except Exception as e:
-            logger.error(safe_log_message(
-                f"❌ Setup failed: {e}",
-                f"Error: Setup failed: {e}"
-            ))
+            logger.error("❌ Setup failed: %s", e)
             raise
     
+    async def _sync_commands_if_changed(self) -> bool:
+        """Sync slash commands only if their definitions changed since the last sync"""
+        commands_payload = sorted((command.to_dict() for command in self.tree.get_commands()), key=lambda c: c['name'])
+        digest = hashlib.sha256(
+            json.dumps([self.application_id, commands_payload], sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        
+        try:
+            with open(COMMAND_DIGEST_PATH, 'r', encoding='utf-8') as f:
+                if f.read().strip() == digest:
+                    return False
+        except OSError:
+            pass  # No previous sync recorded
+        
+        await self.tree.sync()
+        
+        try:
+            with open(COMMAND_DIGEST_PATH, 'w', encoding='utf-8') as f:
+                f.write(digest)
+        except OSError as e:
+            logger.warning("⚠️ Failed to save command digest: %s", e)
+        
+        return True
+    
     async def on_ready(self):
         """Called when bot is ready"""
-        logger.info(safe_log_message(
-            f'🤖 Bot logged in as {self.user}',
-            f'Bot logged in as {self.user}'
-        ))
+        logger.info('🤖 Bot logged in as %s', self.user)
         
-        sheets_status = "connected" if self.db.is_connected() else "disconnected"
-        logger.info(safe_log_message(
-            f'📊 Google Sheets connection: {"✅" if self.db.is_connected() else "❌"}',
-            f'Google Sheets connection: {sheets_status}'
-        ))
+        logger.info('📊 Google Sheets connection: %s', "✅" if self.db.is_connected() else "❌")
         
         # Send startup notification
         await self.notifications.send_startup_notification()
     
-    @tasks.loop(hours=24)  # Check daily
+    @tasks.loop(time=time(hour=Config.NOTIFICATION_HOUR, tzinfo=Config.TIMEZONE))  # Check daily at a fixed local time
     async def check_expiring_items(self):
         """Background task to check for expiring items"""
         try:
-            expiring_items = self.db.get_expiring_items()
+            expiring_items = await self.db.get_expiring_items()
             if expiring_items:
                 await self.notifications.send_expiring_items_alert(expiring_items)
-                logger.info(f"📢 Sent notification for {len(expiring_items)} expiring items")
+                logger.info("📢 Sent notification for %d expiring items", len(expiring_items))
         except Exception as e:
-            logger.error(f"❌ Failed to check expiring items: {e}")
+            logger.error("❌ Failed to check expiring items: %s", e)
     
     @check_expiring_items.before_loop
     async def before_check_expiring_items(self):
@@ -85,10 +117,60 @@ class ClanStorageBot(commands.Bot):
 # Initialize bot
 bot = ClanStorageBot()
 
+class ItemPagerView(discord.ui.View):
+    """Previous/next buttons that swap between pre-built list_items pages"""
+    def __init__(self, embeds: list, author_id: int):
+        super().__init__(timeout=300)
+        self.embeds = embeds
+        self.author_id = author_id
+        self.page = 0
+        # The followup message carrying this view, so the buttons can be disabled on timeout
+        self.message: Optional[discord.WebhookMessage] = None
+        self._update_buttons()
+    
+    def _update_buttons(self):
+        """Disable buttons that would move past the first or last page"""
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page == len(self.embeds) - 1
+    
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Only the user who ran the command can flip pages"""
+        if interaction.user.id == self.author_id:
+            return True
+        
+        # Answer the click so Discord doesn't report it as a failed interaction
+        await interaction.response.send_message(
+            "❌ Hanya pengguna yang menjalankan command ini yang bisa mengganti halaman.", ephemeral=True
+        )
+        return False
+    
+    async def on_timeout(self):
+        """Disable the buttons once they stop responding"""
+        for item in self.children:
+            item.disabled = True
+        
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException as e:
+                logger.warning("⚠️ Failed to disable pager buttons: %s", e)
+    
+    @discord.ui.button(label="◀️ Sebelumnya", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page -= 1
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.embeds[self.page], view=self)
+    
+    @discord.ui.button(label="Berikutnya ▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.embeds[self.page], view=self)
+
 def is_authorized():
     """Decorator to check if user is authorized"""
     def predicate(interaction: discord.Interaction) -> bool:
-        return str(interaction.user.id) in Config.AUTHORIZED_USERS
+        return interaction.user.id in Config.AUTHORIZED_USERS
     return discord.app_commands.check(predicate)
 
 @bot.tree.command(name="add_item", description="🎒 Tambah item baru ke storage clan")
@@ -101,16 +183,12 @@ def is_authorized():
 @is_authorized()
 async def add_item(interaction: discord.Interaction, nama_item: str, tipe: str, participant: str, created_date: str = None):
     """Add new item to clan storage"""
-    await interaction.response.defer()
+    await interaction.response.defer(thinking=True)
     
     try:
         # Validate item type
         if tipe.upper() not in Config.ITEM_TYPES:
-            embed = discord.Embed(
-                title="❌ Tipe Item Tidak Valid",
-                description=f"Tipe harus salah satu dari: {', '.join(Config.ITEM_TYPES)}",
-                color=discord.Color.red()
-            )
+            embed = _INVALID_TYPE_EMBED
             await interaction.followup.send(embed=embed, ephemeral=True)
             return
         
@@ -120,25 +198,25 @@ async def add_item(interaction: discord.Interaction, nama_item: str, tipe: str,
             try:
                 from utils import parse_date_input
                 custom_created_at = parse_date_input(created_date)
-                logger.info(f"Using custom created date: {custom_created_at}")
+                logger.info("Using custom created date: %s", custom_created_at)
             except ValueError as e:
-                embed = discord.Embed(
-                    title="❌ Format Tanggal Tidak Valid",
-                    description=f"Format tanggal salah: {e}\n\nContoh format yang benar:\n• `2024-01-15` (YYYY-MM-DD)\n• `15/01/2024` (DD/MM/YYYY)\n• `15-01-2024` (DD-MM-YYYY)",
-                    color=discord.Color.red()
+                embed = _error_embed(
+                    f"Format tanggal salah: {e}\n\nContoh format yang benar:\n• `2024-01-15` (YYYY-MM-DD)\n• `15/01/2024` (DD/MM/YYYY)\n• `15-01-2024` (DD-MM-YYYY)",
+                    "❌ Format Tanggal Tidak Valid"
                 )
                 await interaction.followup.send(embed=embed, ephemeral=True)
                 return
         
-        # Add item to database
-        success = bot.db.add_item(nama_item, tipe.upper(), participant, custom_created_at)
+        # Add item to database, stored timestamp and embed share the same instant
+        now = local_now()
+        success = await bot.db.add_item(nama_item, tipe.upper(), participant, custom_created_at or now)
         
         if success:
             # Create success embed
             embed = discord.Embed(
                 title="✅ Item Berhasil Ditambahkan",
                 color=discord.Color.green(),
-                timestamp=datetime.now(Config.TIMEZONE)
+                timestamp=now
             )
             embed.add_field(name="📦 Nama Item", value=nama_item, inline=True)
             embed.add_field(name="🏷️ Tipe", value=tipe.upper(), inline=True)
@@ -156,46 +234,38 @@ async def add_item(interaction: discord.Interaction, nama_item: str, tipe: str,
             embed.set_footer(text=f"Ditambahkan oleh {interaction.user.display_name}")
             
             await interaction.followup.send(embed=embed)
-            logger.info(f"✅ Item added by {interaction.user}: {nama_item}")
+            logger.info("✅ Item added by %s: %s", interaction.user, nama_item)
             
         else:
-            embed = discord.Embed(
-                title="❌ Gagal Menambahkan Item",
-                description="Terjadi kesalahan saat menyimpan item. Silakan coba lagi.",
-                color=discord.Color.red()
-            )
+            embed = _ADD_FAILED_EMBED
             await interaction.followup.send(embed=embed, ephemeral=True)
             
     except Exception as e:
-        logger.error(f"❌ Error in add_item command: {e}")
-        embed = discord.Embed(
-            title="❌ Terjadi Kesalahan",
-            description="Maaf, terjadi kesalahan sistem. Silakan coba lagi nanti.",
-            color=discord.Color.red()
-        )
+        logger.error("❌ Error in add_item command: %s", e)
+        embed = _ERROR_EMBED_GENERIC
         await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="list_items", description="📋 Lihat semua item di storage clan")
 @is_authorized()
 async def list_items(interaction: discord.Interaction):
     """List all items in clan storage"""
-    await interaction.response.defer()
+    await interaction.response.defer(thinking=True)
     
     try:
-        items = bot.db.get_all_items()
+        items = await bot.db.get_all_items()
         
         if not items:
-            embed = discord.Embed(
-                title="📭 Storage Kosong",
-                description="Belum ada item yang tersimpan di storage clan.",
-                color=discord.Color.orange()
-            )
+            embed = _EMPTY_STORAGE_EMBED
             await interaction.followup.send(embed=embed)
             return
         
         # Create paginated embeds (10 items per page)
         items_per_page = 10
         total_pages = (len(items) + items_per_page - 1) // items_per_page
+        now = local_now()
+        # Sheet timestamps are naive local times
+        naive_now = now.replace(tzinfo=None)
+        embeds = []
         
         for page in range(total_pages):
             start_idx = page * items_per_page
@@ -206,46 +276,54 @@ async def list_items(interaction: discord.Interaction):
                 title=f"📋 Storage Clan - Halaman {page + 1}/{total_pages}",
                 description=f"Total: {len(items)} item",
                 color=discord.Color.blue(),
-                timestamp=datetime.now(Config.TIMEZONE)
+                timestamp=now
             )
             
             for item in page_items:
-                expire_date = datetime.strptime(item['Expire'], '%Y-%m-%d %H:%M:%S')
-                days_until_expire = (expire_date - datetime.now()).days
-                
-                status_emoji = "🟢" if days_until_expire > 7 else "🟡" if days_until_expire > 0 else "🔴"
+                try:
+                    expire_date = parse_sheet_datetime(item['Expire'])
+                except ValueError:
+                    # One bad cell shouldn't hide the whole list; show the item without a countdown
+                    logger.warning("⚠️ Item %s has invalid expire date: %s", item.get('No'), item.get('Expire'))
+                    status_emoji = "⚪"
+                    expire_text = "tidak valid"
+                else:
+                    days_until_expire = (expire_date - naive_now).days
+                    status_emoji = "🟢" if days_until_expire > 7 else "🟡" if days_until_expire > 0 else "🔴"
+                    expire_text = f"{days_until_expire} hari lagi"
                 
                 embed.add_field(
                     name=f"{status_emoji} {item['No']}. {item['Nama Item']} ({item['Type']})",
-                    value=f"👥 {item['Participant']}\n⏰ Expire: {days_until_expire} hari lagi",
+                    value=f"👥 {item['Participant']}\n⏰ Expire: {expire_text}",
                     inline=False
                 )
             
-            await interaction.followup.send(embed=embed)
-            
-            # Add delay between pages to avoid rate limiting
-            if page < total_pages - 1:
-                await asyncio.sleep(1)
+            embeds.append(embed)
+        
+        # Single followup; extra pages are reached through the pager buttons
+        if len(embeds) > 1:
+            view = ItemPagerView(embeds, interaction.user.id)
+            # Application webhook followups always wait, so this returns the sent message
+            view.message = await interaction.followup.send(embed=embeds[0], view=view)
+        else:
+            await interaction.followup.send(embed=embeds[0])
         
-        logger.info(f"📋 Items listed by {interaction.user}")
+        logger.info("📋 Items listed by %s", interaction.user)
         
     except Exception as e:
-        logger.error(f"❌ Error in list_items command: {e}")
-        embed = discord.Embed(
-            title="❌ Terjadi Kesalahan",
-            description="Maaf, terjadi kesalahan saat mengambil data. Silakan coba lagi nanti.",
-            color=discord.Color.red()
-        )
+        logger.error("❌ Error in list_items command: %s", e)
+        embed = _ERROR_EMBED_FETCH
         await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="check_expiring", description="⏰ Cek item yang akan expire")
 @is_authorized()
 async def check_expiring(interaction: discord.Interaction):
     """Check items that are about to expire"""
-    await interaction.response.defer()
+    await interaction.response.defer(thinking=True)
     
     try:
-        expiring_items = bot.db.get_expiring_items()
+        expiring_items = await bot.db.get_expiring_items()
+        now = local_now()
         
         if not expiring_items:
             embed = discord.Embed(
@@ -260,11 +338,11 @@ async def check_expiring(interaction: discord.Interaction):
             title="⚠️ Item yang Akan Expire",
             description=f"Ada {len(expiring_items)} item yang akan expire:",
             color=discord.Color.orange(),
-            timestamp=datetime.now(Config.TIMEZONE)
+            timestamp=now
         )
         
         for item in expiring_items:
-            days_until_expire = (item['expire_date'] - datetime.now(Config.TIMEZONE)).days
+            days_until_expire = (item['expire_date'] - now).days
             
             if days_until_expire <= 0:
                 status = "🔴 EXPIRED"
@@ -280,28 +358,25 @@ async def check_expiring(interaction: discord.Interaction):
             )
         
         await interaction.followup.send(embed=embed)
-        logger.info(f"⏰ Expiring items checked by {interaction.user}")
+        logger.info("⏰ Expiring items checked by %s", interaction.user)
         
     except Exception as e:
-        logger.error(f"❌ Error in check_expiring command: {e}")
-        embed = discord.Embed(
-            title="❌ Terjadi Kesalahan",
-            description="Maaf, terjadi kesalahan saat mengecek item. Silakan coba lagi nanti.",
-            color=discord.Color.red()
-        )
+        logger.error("❌ Error in check_expiring command: %s", e)
+        embed = _ERROR_EMBED_CHECK
         await interaction.followup.send(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="status", description="📊 Cek status bot dan koneksi")
 @is_authorized()
 async def status(interaction: discord.Interaction):
     """Check bot status and connections"""
-    await interaction.response.defer()
+    await interaction.response.defer(thinking=True)
     
     try:
+        now = local_now()
         embed = discord.Embed(
             title="📊 Status Bot",
             color=discord.Color.blue(),
-            timestamp=datetime.now(Config.TIMEZONE)
+            timestamp=now
         )
         
         # Check Google Sheets connection
@@ -309,29 +384,22 @@ async def status(interaction: discord.Interaction):
         embed.add_field(name="📊 Google Sheets", value=sheets_status, inline=True)
         
         # Bot uptime
-        uptime = datetime.now(Config.TIMEZONE) - bot.launch_time if hasattr(bot, 'launch_time') else "Unknown"
+        uptime = now - bot.launch_time if hasattr(bot, 'launch_time') else "Unknown"
         embed.add_field(name="⏰ Uptime", value=str(uptime), inline=True)
         
-        # Total items
-        total_items = len(bot.db.get_all_items())
+        # Total and expiring items
+        total_items, expiring_count = await bot.db.get_stats()
         embed.add_field(name="📦 Total Items", value=str(total_items), inline=True)
-        
-        # Expiring items
-        expiring_count = len(bot.db.get_expiring_items())
         embed.add_field(name="⚠️ Items Akan Expire", value=str(expiring_count), inline=True)
         
         embed.set_footer(text=f"Dicek oleh {interaction.user.display_name}")
         
         await interaction.followup.send(embed=embed)
-        logger.info(f"📊 Status checked by {interaction.user}")
+        logger.info("📊 Status checked by %s", interaction.user)
         
     except Exception as e:
-        logger.error(f"❌ Error in status command: {e}")
-        embed = discord.Embed(
-            title="❌ Terjadi Kesalahan",
-            description="Maaf, terjadi kesalahan saat mengecek status. Silakan coba lagi nanti.",
-            color=discord.Color.red()
-        )
+        logger.error("❌ Error in status command: %s", e)
+        embed = _ERROR_EMBED_STATUS
         await interaction.followup.send(embed=embed, ephemeral=True)
 
 # Error handlers
@@ -342,19 +410,11 @@ async def status(interaction: discord.Interaction):
 async def command_error(interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
     """Handle command errors"""
     if isinstance(error, discord.app_commands.CheckFailure):
-        embed = discord.Embed(
-            title="🚫 Akses Ditolak",
-            description="Anda tidak memiliki izin untuk menggunakan command ini.",
-            color=discord.Color.red()
-        )
+        embed = _ACCESS_DENIED_EMBED
         await interaction.response.send_message(embed=embed, ephemeral=True)
     else:
-        logger.error(f"❌ Command error: {error}")
-        embed = discord.Embed(
-            title="❌ Terjadi Kesalahan",
-            description="Maaf, terjadi kesalahan sistem. Silakan coba lagi nanti.",
-            color=discord.Color.red()
-        )
+        logger.error("❌ Command error: %s", error)
+        embed = _ERROR_EMBED_GENERIC
         if not interaction.response.is_done():
             await interaction.response.send_message(embed=embed, ephemeral=True)
         else:
@@ -362,8 +422,12 @@ async def command_error(interaction: discord.Interaction, error: discord.app_com
 
 if __name__ == "__main__":
     try:
-        bot.launch_time = datetime.now(Config.TIMEZONE)
+        import os
+        os.makedirs('./logs', exist_ok=True)
+        Config.validate()
+        
+        bot.launch_time = local_now()
         bot.run(Config.DISCORD_TOKEN)
     except Exception as e:
-        logger.error(f"❌ Failed to start bot: {e}")
+        logger.error("❌ Failed to start bot: %s", e)
         raise
\ No newline at end of file
@@ -1,7 +1,11 @@
 import os
 from dotenv import load_dotenv
-from typing import List
-import pytz
+from typing import FrozenSet, Tuple
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python 3.8
+    from backports.zoneinfo import ZoneInfo
 
 load_dotenv()
 
@@ -17,15 +21,21 @@ class Config:
     WORKSHEET_NAME = 'Sheet1'
     
     # Authorization
-    AUTHORIZED_USERS: List[str] = os.getenv('AUTHORIZED_USERS', '').split(',')
+    # Stored as ints so checks can compare Discord user IDs directly
+    AUTHORIZED_USERS: FrozenSet[int] = frozenset(
+        int(user) for user in os.getenv('AUTHORIZED_USERS', '').replace(' ', '').split(',') if user.isdigit()
+    )
     
     # Bot Settings
-    TIMEZONE = pytz.timezone(os.getenv('TIMEZONE', 'Asia/Jakarta'))
+    TIMEZONE = ZoneInfo(os.getenv('TIMEZONE', 'Asia/Jakarta'))
     NOTIFICATION_DAYS_BEFORE = int(os.getenv('NOTIFICATION_DAYS_BEFORE', '7'))
+    NOTIFICATION_HOUR = int(os.getenv('NOTIFICATION_HOUR', '9'))  # Local hour for the daily expiry check
     ITEM_EXPIRY_DAYS = 30
+    SHEETS_CACHE_TTL = int(os.getenv('SHEETS_CACHE_TTL', '30'))  # Seconds sheet reads are reused
     
     # Item Types
-    ITEM_TYPES = ['UNIQUE', 'RED', 'CONSUMABLE']
+    ITEM_TYPE_ORDER: Tuple[str, ...] = ('UNIQUE', 'RED', 'CONSUMABLE')  # Display order
+    ITEM_TYPES: FrozenSet[str] = frozenset(ITEM_TYPE_ORDER)  # Membership checks
     
     # Validation
     @classmethod
@@ -35,7 +45,7 @@ class Config:
             errors.append("DISCORD_TOKEN is required")
         if not os.path.exists(cls.GOOGLE_CREDENTIALS_PATH):
             errors.append(f"Google credentials file not found: {cls.GOOGLE_CREDENTIALS_PATH}")
-        if not cls.AUTHORIZED_USERS or cls.AUTHORIZED_USERS == ['']:
+        if not cls.AUTHORIZED_USERS:
             errors.append("AUTHORIZED_USERS must be set")
         
         if errors:
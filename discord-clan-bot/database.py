@@ -1,70 +1,187 @@
 import gspread
+from gspread.exceptions import APIError
+from gspread.utils import ValueRenderOption
 from google.auth import default
-from google.auth.exceptions import GoogleAuthError
 import logging
-from datetime import datetime, timedelta
+import asyncio
+import bisect
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Optional, Tuple
 from config import Config
+from utils import parse_sheet_datetime, local_now
 import os
+import random
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
 class DatabaseManager:
+    # Seconds a fetched copy of the sheet is reused before hitting the API again
+    _CACHE_TTL = Config.SHEETS_CACHE_TTL
+    
+    # Sheets API statuses worth retrying, and how many attempts a call gets in total
+    _RETRY_STATUSES = {429, 500, 503}
+    _MAX_ATTEMPTS = 5
+    
+    # Upper bound on rows sent in a single values.append request
+    _MAX_BATCH_ROWS = 50
+    
+    # Access token from the previous run, reused while it still has this much life left
+    _TOKEN_CACHE_PATH = './data/.sheets_token.json'
+    _TOKEN_MIN_LIFETIME = timedelta(seconds=60)
+    
+    HEADERS = ['No', 'Nama Item', 'Type', 'Participant', 'CreatedAt', 'UpdateAt', 'Expire']
+    
     def __init__(self):
         self.gc = None
         self.worksheet = None
+        # Bounded pool for blocking gspread calls so they never starve the default executor
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='sheets')
+        self._records_cache: Optional[List[Dict]] = None
+        self._records_cache_ts: float = 0.0
+        self._records_lock = threading.Lock()
+        # Bumped by every write; the cache is only served while its fetch generation is still current
+        self._cache_generation = 0
+        self._records_cache_generation = -1
+        # (expire datetimes, expiring-item dicts) sorted by expiry, rebuilt with the records cache
+        self._expire_index: Tuple[List[datetime], List[Dict]] = ([], [])
+        # Next free "No" value, seeded lazily from the sheet and then kept in memory.
+        # Only read and written on the event loop thread, never from the Sheets pool.
+        self._next_no: Optional[int] = None
+        # Highest "No" in the cached records, handed back to the loop with each fetch
+        self._records_max_no = 0
+        self._headers: List[str] = []
+        # Rows waiting to be appended, each with the future its add_item call awaits
+        self._pending_rows: List[Tuple[List, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
         self._connect_google_sheets()
     
     
     def _connect_google_sheets(self):
         """Connect to Google Sheets"""
         try:
-            if os.path.exists(Config.GOOGLE_CREDENTIALS_PATH):
+            # Only service-account tokens are cached; ADC/GCE credentials are never loaded back
+            use_service_account = os.path.exists(Config.GOOGLE_CREDENTIALS_PATH)
+            if use_service_account:
                 self.gc = gspread.service_account(filename=Config.GOOGLE_CREDENTIALS_PATH)
+                self._load_cached_token(self.gc.auth)
             else:
                 # Fallback to default credentials
                 creds, _ = default()
                 self.gc = gspread.authorize(creds)
             
-            self.worksheet = self.gc.open_by_key(Config.GOOGLE_SHEETS_ID).worksheet(Config.WORKSHEET_NAME)
+            spreadsheet = self._sheets_call(self.gc.open_by_key, Config.GOOGLE_SHEETS_ID)
+            self.worksheet = self._sheets_call(spreadsheet.worksheet, Config.WORKSHEET_NAME)
             
             # Ensure headers exist
-            self._ensure_headers()
+            self._ensure_headers(spreadsheet)
+            if use_service_account:
+                self._save_cached_token(self.gc.auth)
             logger.info("✅ Connected to Google Sheets")
             
         except Exception as e:
-            logger.error(f"❌ Failed to connect to Google Sheets: {e}")
+            logger.error("❌ Failed to connect to Google Sheets: %s", e)
             logger.info("📱 Google Sheets connection required for bot operation")
     
-    def _ensure_headers(self):
+    def _load_cached_token(self, creds):
+        """Attach a still-valid access token from the last run so startup skips the OAuth exchange"""
+        try:
+            with open(self._TOKEN_CACHE_PATH, encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached['account'] != creds.service_account_email:
+                return
+            # google-auth keeps expiry as naive UTC
+            expiry = datetime.fromisoformat(cached['expiry'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        
+        if expiry - datetime.now(timezone.utc).replace(tzinfo=None) > self._TOKEN_MIN_LIFETIME:
+            # An early revocation surfaces as a 401, which the authorized session refreshes on
+            creds.token = cached['token']
+            creds.expiry = expiry
+    
+    def _save_cached_token(self, creds):
+        """Persist the current access token and its expiry for the next process start"""
+        account = getattr(creds, 'service_account_email', None)
+        if not isinstance(account, str) or not creds.token or not creds.expiry:
+            return
+        
+        try:
+            os.makedirs(os.path.dirname(self._TOKEN_CACHE_PATH), exist_ok=True)
+            fd = os.open(self._TOKEN_CACHE_PATH, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with open(fd, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'account': account,
+                    'token': creds.token,
+                    'expiry': creds.expiry.isoformat()
+                }, f)
+        except OSError as e:
+            logger.warning("⚠️ Could not cache Sheets access token: %s", e)
+    
+    def _ensure_headers(self, spreadsheet):
         """Ensure Google Sheets has proper headers"""
         if not self.worksheet:
             return
         
-        headers = ['No', 'Nama Item', 'Type', 'Participant', 'CreatedAt', 'UpdateAt', 'Expire']
-        
         try:
-            existing_headers = self.worksheet.row_values(1)
-            if not existing_headers or existing_headers != headers:
-                self.worksheet.update('A1:G1', [headers])
+            # Fetch the header row and the No column in a single request
+            sheet = Config.WORKSHEET_NAME
+            response = self._sheets_call(
+                spreadsheet.values_batch_get,
+                [f"'{sheet}'!A1:G1", f"'{sheet}'!A2:A"],
+                params={'valueRenderOption': ValueRenderOption.unformatted}
+            )
+            header_range, numbers_range = response.get('valueRanges', [{}, {}])
+            
+            header_rows = header_range.get('values', [])
+            self._headers = header_rows[0] if header_rows else []
+            if self._headers != self.HEADERS:
+                self._sheets_call(self.worksheet.update, 'A1:G1', [self.HEADERS])
+                self._headers = list(self.HEADERS)
                 logger.info("📋 Headers updated in Google Sheets")
+            
+            # Seed the item counter from the same response
+            self._next_no = self._next_number_from(numbers_range.get('values', []))
         except Exception as e:
-            logger.error(f"❌ Failed to update headers: {e}")
+            logger.error("❌ Failed to update headers: %s", e)
+    
+    def _sheets_call(self, func, *args, idempotent: bool = True, **kwargs):
+        """Call a gspread function, retrying transient API errors with exponential backoff"""
+        retry_statuses = self._RETRY_STATUSES if idempotent else {429}
+        
+        for attempt in range(self._MAX_ATTEMPTS):
+            try:
+                return func(*args, **kwargs)
+            except APIError as e:
+                status = e.response.status_code
+                if status not in retry_statuses or attempt == self._MAX_ATTEMPTS - 1:
+                    raise
+                
+                delay = min(60, 2 ** attempt + random.random())
+                logger.warning("⚠️ Sheets API returned %s, retrying in %.1fs", status, delay)
+                # Runs in the Sheets thread pool (or before the loop starts), so blocking sleep is fine
+                time.sleep(delay)
     
-    def add_item(self, nama_item: str, item_type: str, participant: str, custom_created_at: datetime = None) -> bool:
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking gspread call in the Sheets thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    async def add_item(self, nama_item: str, item_type: str, participant: str, custom_created_at: datetime = None) -> bool:
         """Add new item to storage with optional custom creation date"""
         try:
             # Use custom created date or current time
             if custom_created_at:
                 created_at = custom_created_at
             else:
-                created_at = datetime.now(Config.TIMEZONE)
+                created_at = local_now()
             
             expire_date = created_at + timedelta(days=Config.ITEM_EXPIRY_DAYS)
             
-            # Get next number
-            next_no = self._get_next_number()
-            
             # Format dates for sheets
             created_str = created_at.strftime('%Y-%m-%d %H:%M:%S')
             expire_str = expire_date.strftime('%Y-%m-%d %H:%M:%S')
@@ -74,86 +191,221 @@ class DatabaseManager:
                 logger.error("❌ Google Sheets not connected")
                 return False
             
+            # Get next number
+            next_no = await self._get_next_number()
+            
             try:
                 row = [next_no, nama_item, item_type.upper(), participant, created_str, created_str, expire_str]
-                self.worksheet.append_row(row)
-                logger.info(f"✅ Item added to Google Sheets: {nama_item}")
+                await self._queue_row(row)
+                logger.info("✅ Item added to Google Sheets: %s", nama_item)
                 return True
             except Exception as e:
-                logger.error(f"❌ Failed to add to Google Sheets: {e}")
+                # The sheet may have changed under us, rescan on the next add
+                self._next_no = None
+                logger.error("❌ Failed to add to Google Sheets: %s", e)
                 return False
             
         except Exception as e:
-            logger.error(f"❌ Failed to add item: {e}")
+            logger.error("❌ Failed to add item: %s", e)
             return False
     
-    def _get_next_number(self) -> int:
-        """Get next sequential number for items"""
-        try:
-            if not self.worksheet:
-                return 1
-            
-            # Get all values and find max number
-            values = self.worksheet.get_all_values()
-            if len(values) > 1:  # Skip header
-                numbers = []
-                for row in values[1:]:
-                    if row and row[0].isdigit():
-                        numbers.append(int(row[0]))
-                return max(numbers) + 1 if numbers else 1
+    async def _queue_row(self, row: List):
+        """Queue a row for the next batched append and wait until it is written"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending_rows.append((row, future))
+        
+        # Rows queued while a flush is in flight go out together in its next batch
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_pending())
+        
+        await future
+    
+    async def _flush_pending(self):
+        """Drain queued rows into batched values.append requests"""
+        while self._pending_rows:
+            batch = self._pending_rows[:self._MAX_BATCH_ROWS]
+            del self._pending_rows[:self._MAX_BATCH_ROWS]
             
+            try:
+                await self._run(self._append_rows, [row for row, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                self._invalidate_cache()
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+                
+                if len(batch) > 1:
+                    logger.info("📦 Appended %d items in one batch", len(batch))
+    
+    async def flush(self):
+        """Wait until every queued row has been written to Google Sheets"""
+        if self._flush_task is not None and not self._flush_task.done():
+            await self._flush_task
+    
+    def _append_rows(self, rows: List[List]):
+        """Append rows to the sheet in one values.append request"""
+        # Only retry rejected (429) appends; a 5xx may have written the rows already
+        self._sheets_call(
+            self.worksheet.spreadsheet.values_append,
+            f"'{Config.WORKSHEET_NAME}'!A:G",
+            params={'valueInputOption': 'RAW', 'insertDataOption': 'INSERT_ROWS'},
+            body={'values': rows},
+            idempotent=False
+        )
+    
+    async def _get_next_number(self) -> int:
+        """Reserve the next sequential number for a new item"""
+        if self._next_no is None:
+            scanned = await self._scan_next_number()
+            # Another add may have seeded the counter while we were scanning
+            if self._next_no is None:
+                self._next_no = scanned
+        
+        next_no = self._next_no
+        self._next_no += 1
+        return next_no
+    
+    async def _scan_next_number(self) -> int:
+        """Scan the No column of the sheet for the next free number"""
+        if not self.worksheet:
             return 1
+        
+        try:
+            # Only the No column is needed; unformatted cells come back as ints
+            rows = await self._run(
+                self._sheets_call, self.worksheet.get, 'A2:A', value_render_option=ValueRenderOption.unformatted
+            )
+            return self._next_number_from(rows)
             
         except Exception as e:
-            logger.error(f"❌ Failed to get next number: {e}")
-            return 1
+            # Propagate instead of guessing 1, which the counter would keep and reuse for every later add
+            logger.error("❌ Failed to get next number: %s", e)
+            raise
+    
     
+    @staticmethod
+    def _next_number_from(rows: List[List]) -> int:
+        """Next free number given unformatted No column rows"""
+        return max((row[0] for row in rows if row and isinstance(row[0], int)), default=0) + 1
     
-    def get_expiring_items(self) -> List[Dict]:
+    async def get_expiring_items(self) -> List[Dict]:
         """Get items expiring within notification period"""
         try:
             if not self.worksheet:
                 logger.error("❌ Google Sheets not connected")
                 return []
             
-            notification_date = datetime.now(Config.TIMEZONE) + timedelta(days=Config.NOTIFICATION_DAYS_BEFORE)
-            expiring_items = []
-            
-            records = self.worksheet.get_all_records()
-            for record in records:
-                expire_str = record.get('Expire', '')
-                if expire_str:
-                    expire_date = datetime.strptime(expire_str, '%Y-%m-%d %H:%M:%S')
-                    expire_date = Config.TIMEZONE.localize(expire_date)
-                    
-                    if expire_date <= notification_date:
-                        expiring_items.append({
-                            'no': record.get('No'),
-                            'nama_item': record.get('Nama Item'),
-                            'type': record.get('Type'),
-                            'participant': record.get('Participant'),
-                            'expire_date': expire_date
-                        })
-            
-            return expiring_items
+            notification_date = local_now() + timedelta(days=Config.NOTIFICATION_DAYS_BEFORE)
+            _, (expire_dates, items) = await self._load_records()
+            
+            # Items are sorted by expiry, so everything up to the cutoff is expiring
+            return items[:bisect.bisect_right(expire_dates, notification_date)]
             
         except Exception as e:
-            logger.error(f"❌ Failed to get expiring items: {e}")
+            logger.error("❌ Failed to get expiring items: %s", e)
             return []
     
-    def get_all_items(self) -> List[Dict]:
+    async def get_all_items(self) -> List[Dict]:
         """Get all items from storage"""
         try:
             if not self.worksheet:
                 logger.error("❌ Google Sheets not connected")
                 return []
             
-            return self.worksheet.get_all_records()
+            records, _ = await self._load_records()
+            return records
                 
         except Exception as e:
-            logger.error(f"❌ Failed to get all items: {e}")
+            logger.error("❌ Failed to get all items: %s", e)
             return []
     
+    async def get_stats(self) -> Tuple[int, int]:
+        """Get (total, expiring) item counts from a single records fetch"""
+        try:
+            if not self.worksheet:
+                logger.error("❌ Google Sheets not connected")
+                return 0, 0
+            
+            notification_date = local_now() + timedelta(days=Config.NOTIFICATION_DAYS_BEFORE)
+            records, (expire_dates, _) = await self._load_records()
+            return len(records), bisect.bisect_right(expire_dates, notification_date)
+            
+        except Exception as e:
+            logger.error("❌ Failed to get stats: %s", e)
+            return 0, 0
+    
+    async def _load_records(self) -> Tuple[List[Dict], Tuple[List[datetime], List[Dict]]]:
+        """Get records and their expiry index, keeping the item counter ahead of the sheet"""
+        records, expire_index, max_no = await self._run(self._get_records)
+        
+        # Applied here on the loop so it can't interleave with _get_next_number reserving a number
+        if max_no:
+            self._next_no = max(self._next_no or 1, max_no + 1)
+        
+        return records, expire_index
+    
+    def _get_records(self) -> Tuple[List[Dict], Tuple[List[datetime], List[Dict]], int]:
+        """Get all sheet records, their expiry index and highest No, reusing a recent fetch when still fresh"""
+        with self._records_lock:
+            if (
+                self._records_cache is not None
+                and self._records_cache_generation == self._cache_generation
+                and time.monotonic() - self._records_cache_ts < self._CACHE_TTL
+            ):
+                return self._records_cache, self._expire_index, self._records_max_no
+            
+            generation = self._cache_generation
+            
+            # Raw range read; records are zipped against the known header layout
+            rows = self._sheets_call(self.worksheet.get, 'A2:G', value_render_option=ValueRenderOption.unformatted)
+            self._records_cache = [dict(zip(self.HEADERS, row)) for row in rows if len(row) >= len(self.HEADERS)]
+            # If a write landed while we were reading, the generation no longer matches and the next read refetches
+            self._records_cache_generation = generation
+            self._records_cache_ts = time.monotonic()
+            
+            # A fresh fetch gives us the highest number in use for free
+            self._records_max_no = max(
+                (record['No'] for record in self._records_cache if isinstance(record.get('No'), int)), default=0
+            )
+            
+            self._expire_index = self._build_expire_index(self._records_cache)
+            return self._records_cache, self._expire_index, self._records_max_no
+    
+    @staticmethod
+    def _build_expire_index(records: List[Dict]) -> Tuple[List[datetime], List[Dict]]:
+        """Parse every Expire cell once and sort items by expiry for bisect lookups"""
+        entries = []
+        for record in records:
+            expire_str = record.get('Expire', '')
+            if not expire_str:
+                continue
+            
+            try:
+                expire_date = parse_sheet_datetime(expire_str, Config.TIMEZONE)
+            except ValueError:
+                logger.warning("⚠️ Skipping item %s with invalid expire date: %s", record.get('No'), expire_str)
+                continue
+            
+            entries.append((expire_date, {
+                'no': record.get('No'),
+                'nama_item': record.get('Nama Item'),
+                'type': record.get('Type'),
+                'participant': record.get('Participant'),
+                'expire_date': expire_date
+            }))
+        
+        entries.sort(key=lambda entry: entry[0])
+        return [entry[0] for entry in entries], [entry[1] for entry in entries]
+    
+    def _invalidate_cache(self):
+        """Force the next read to fetch fresh records from Google Sheets"""
+        # Lock-free so the loop never blocks on an in-flight fetch; a single increment is all it writes
+        self._cache_generation += 1
+    
     def is_connected(self) -> bool:
         """Check if Google Sheets is connected"""
         return self.worksheet is not None
\ No newline at end of file
@@ -8,144 +8,138 @@ import asyncio
 import signal
 import sys
 import logging
-from datetime import datetime
+from typing import Optional
 
 from config import Config
 from bot import bot
-from utils import setup_logging, safe_log_message
-from notifications import NotificationManager
+from utils import setup_logging, local_now
 
 logger = logging.getLogger(__name__)
 
+# Static part of the shutdown notification; only the timestamp is filled in per send
+_SHUTDOWN_EMBED = {
+    "title": "🛑 Bot Shutdown",
+    "description": "Bot telah dimatikan",
+    "color": 0xff6600,  # Orange
+    "footer": {
+        "text": "Bot akan restart otomatis jika menggunakan process manager"
+    }
+}
+
 class BotManager:
     def __init__(self):
         self.bot = bot
-        self.notifications = NotificationManager()
+        # Share the bot's manager so the whole process uses one webhook session
+        self.notifications = bot.notifications
         self.running = False
+        # Every caller (signal handler, main) awaits this one task instead of racing its own
+        self._shutdown_task: Optional[asyncio.Task] = None
     
     async def start(self):
         """Start the bot with proper error handling"""
         try:
             # Setup logging
             setup_logging()
-            logger.info(safe_log_message(
-                "🚀 Starting Discord Clan Storage Bot...",
-                "Starting Discord Clan Storage Bot..."
-            ))
+            logger.info("🚀 Starting Discord Clan Storage Bot...")
             
             # Validate configuration
-            logger.info(safe_log_message(
-                "🔧 Validating configuration...",
-                "Validating configuration..."
-            ))
+            logger.info("🔧 Validating configuration...")
             Config.validate()
-            logger.info(safe_log_message(
-                "✅ Configuration validated",
-                "Configuration validated"
-            ))
+            logger.info("✅ Configuration validated")
             
             # Test webhook connection
-            logger.info(safe_log_message(
-                "🔗 Testing webhook connection...",
-                "Testing webhook connection..."
-            ))
+            logger.info("🔗 Testing webhook connection...")
             webhook_test = await self.notifications.test_webhook()
             if webhook_test:
-                logger.info(safe_log_message(
-                    "✅ Webhook connection successful",
-                    "Webhook connection successful"
-                ))
+                logger.info("✅ Webhook connection successful")
             else:
-                logger.warning(safe_log_message(
-                    "⚠️ Webhook test failed, notifications may not work",
-                    "Warning: Webhook test failed, notifications may not work"
-                ))
+                logger.warning("⚠️ Webhook test failed, notifications may not work")
             
             # Start bot
             self.running = True
-            logger.info(safe_log_message(
-                "🤖 Starting Discord bot...",
-                "Starting Discord bot..."
-            ))
+            logger.info("🤖 Starting Discord bot...")
             await self.bot.start(Config.DISCORD_TOKEN)
             
         except KeyboardInterrupt:
-            logger.info(safe_log_message(
-                "🛑 Received interrupt signal, shutting down...",
-                "Received interrupt signal, shutting down..."
-            ))
+            logger.info("🛑 Received interrupt signal, shutting down...")
             await self.shutdown()
         except Exception as e:
-            logger.error(safe_log_message(
-                f"❌ Failed to start bot: {e}",
-                f"Error: Failed to start bot: {e}"
-            ))
+            logger.error("❌ Failed to start bot: %s", e)
             await self.notifications.send_error_notification(str(e), "Bot Startup")
             raise
     
     async def shutdown(self):
-        """Gracefully shutdown the bot"""
+        """Gracefully shutdown the bot, concurrent callers share a single shutdown"""
+        if self._shutdown_task is None:
+            self._shutdown_task = asyncio.get_running_loop().create_task(self._shutdown())
+        await self._shutdown_task
+    
+    async def _shutdown(self):
         if self.running:
-            logger.info(safe_log_message(
-                "🛑 Shutting down bot...",
-                "Shutting down bot..."
-            ))
+            logger.info("🛑 Shutting down bot...")
             self.running = False
             
+            # Write any queued items before disconnecting
+            try:
+                await self.bot.db.flush()
+            except Exception as e:
+                logger.error("❌ Failed to flush pending items: %s", e)
+            
             # Close bot connection
             if not self.bot.is_closed():
                 await self.bot.close()
             
             # Send shutdown notification
             try:
-                embed = {
-                    "title": "🛑 Bot Shutdown",
-                    "description": "Bot telah dimatikan",
-                    "color": 0xff6600,  # Orange
-                    "timestamp": datetime.now(Config.TIMEZONE).isoformat(),
-                    "footer": {
-                        "text": "Bot akan restart otomatis jika menggunakan process manager"
-                    }
-                }
+                embed = {**_SHUTDOWN_EMBED, "timestamp": local_now().isoformat()}
                 await self.notifications.send_webhook_message(embed)
             except Exception as e:
-                logger.error(safe_log_message(
-                    f"❌ Failed to send shutdown notification: {e}",
-                    f"Error: Failed to send shutdown notification: {e}"
-                ))
+                logger.error("❌ Failed to send shutdown notification: %s", e)
             
-            logger.info(safe_log_message(
-                "✅ Bot shutdown complete",
-                "Bot shutdown complete"
-            ))
+            logger.info("✅ Bot shutdown complete")
+        
+        # Sends anything still queued, then releases the HTTP session
+        await self.notifications.close()
 
-def setup_signal_handlers(bot_manager):
+def setup_signal_handlers(bot_manager, loop):
     """Setup signal handlers for graceful shutdown"""
-    def signal_handler(signum, frame):
-        logger.info(safe_log_message(
-            f"🛑 Received signal {signum}",
-            f"Received signal {signum}"
-        ))
-        loop = asyncio.get_event_loop()
+    def request_shutdown(signum):
+        logger.info("🛑 Received signal %s", signum)
         loop.create_task(bot_manager.shutdown())
     
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            # Runs the callback on the loop itself, no cross-thread task creation
+            loop.add_signal_handler(signum, request_shutdown, signum)
+        except NotImplementedError:
+            # Windows event loops have no add_signal_handler
+            signal.signal(signum, lambda sig, frame: loop.call_soon_threadsafe(request_shutdown, sig))
 
 async def main():
     """Main entry point"""
     bot_manager = BotManager()
     
+    loop = asyncio.get_running_loop()
+    
+    # Python 3.12+: tasks that finish without suspending skip the trip through the loop
+    if hasattr(asyncio, 'eager_task_factory'):
+        loop.set_task_factory(asyncio.eager_task_factory)
+    
     # Setup signal handlers
-    setup_signal_handlers(bot_manager)
+    setup_signal_handlers(bot_manager, loop)
     
+    crashed = False
     try:
         await bot_manager.start()
     except Exception as e:
-        logger.error(safe_log_message(
-            f"❌ Bot crashed: {e}",
-            f"Error: Bot crashed: {e}"
-        ))
+        logger.error("❌ Bot crashed: %s", e)
+        crashed = True
+    finally:
+        # start() returns as soon as a signal-triggered shutdown closes the gateway.
+        # Wait for that shutdown here, or asyncio.run cancels it before the queue drains.
+        await bot_manager.shutdown()
+    
+    if crashed:
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -155,6 +149,13 @@ if __name__ == "__main__":
             print("Error: Python 3.8 or higher is required")
             sys.exit(1)
         
+        # Use uvloop where available (not supported on Windows)
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            pass
+        
         # Run the bot
         asyncio.run(main())
         
@@ -1,70 +1,197 @@
 import aiohttp
-import discord
+import asyncio
+import json
 import logging
-from datetime import datetime
-from typing import List, Dict
+from itertools import islice
+from typing import List, Dict, Optional
 from config import Config
+from utils import local_now, cache, chunk_list, MISSING, AdaptiveTokenBucket
 
 logger = logging.getLogger(__name__)
 
+# orjson encodes embed payloads several times faster than stdlib json, use it when installed
+try:
+    from orjson import dumps as _json_dumps
+except ImportError:
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Statuses meaning the webhook itself is gone or revoked, retrying immediately can't succeed
+_WEBHOOK_GONE_STATUSES = {401, 404}
+_WEBHOOK_GONE_TTL = 60
+
+# Attempts per message when Discord answers 429, and the longest Retry-After we'll wait out
+_WEBHOOK_MAX_ATTEMPTS = 3
+_WEBHOOK_MAX_RETRY_AFTER = 60.0
+
+# How long close() waits for queued messages to go out before dropping them
+_QUEUE_DRAIN_TIMEOUT = 10.0
+
+# Client-side admission control shared by every webhook post, so bursts stay under Discord's route limit
+_discord_bucket = AdaptiveTokenBucket()
+
+def _retry_after(response: aiohttp.ClientResponse) -> float:
+    """Seconds Discord asked us to wait before retrying a rate-limited request"""
+    try:
+        return min(_WEBHOOK_MAX_RETRY_AFTER, float(response.headers.get('Retry-After', 1)))
+    except ValueError:
+        return 1.0
+
+# Static parts of the fixed notifications; only timestamps and per-send fields are filled in
+_STARTUP_EMBED = {
+    "title": "🤖 Bot Clan Storage Aktif",
+    "description": "Bot berhasil terhubung dan siap digunakan!",
+    "color": 0x00ff00,  # Green
+    "footer": {
+        "text": "Clan Storage Bot v1.0"
+    }
+}
+_STARTUP_STATUS_FIELD = {
+    "name": "📊 Status",
+    "value": "✅ Online dan Siap",
+    "inline": True
+}
+_STARTUP_COMMANDS_FIELD = {
+    "name": "🛠️ Commands Available",
+    "value": "• `/add_item` - Tambah item baru\n• `/list_items` - Lihat semua item\n• `/check_expiring` - Cek item expire\n• `/status` - Status bot",
+    "inline": False
+}
+
+_ERROR_EMBED = {
+    "title": "❌ Bot Error",
+    "description": "Terjadi kesalahan pada bot",
+    "color": 0xff0000,  # Red
+    "footer": {
+        "text": "Bot mungkin memerlukan restart atau perbaikan"
+    }
+}
+
+_TEST_EMBED = {
+    "title": "🧪 Test Webhook",
+    "description": "Webhook berfungsi dengan baik!",
+    "color": 0x0099ff,  # Blue
+    "footer": {
+        "text": "Test notification"
+    }
+}
+
 class NotificationManager:
     def __init__(self):
         self.webhook_url = Config.DISCORD_WEBHOOK_URL
+        # Shared across sends so webhook posts reuse pooled keep-alive connections
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Fire-and-forget messages, posted in order by one background sender task
+        self._queue: Optional[asyncio.Queue] = None
+        self._sender_task: Optional[asyncio.Task] = None
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, creating it inside the running loop on first use"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=20, ttl_dns_cache=300, keepalive_timeout=75)
+            )
+        return self._session
+    
+    def queue_webhook_message(self, embed_data: dict, content: str = None) -> bool:
+        """Queue a message for the background sender and return without waiting for the post"""
+        if self._sender_task is None:
+            self._queue = asyncio.Queue()
+            self._sender_task = asyncio.get_running_loop().create_task(self._sender_loop())
+        
+        self._queue.put_nowait((embed_data, content))
+        return True
+    
+    async def _sender_loop(self):
+        """Drain the message queue over the shared session"""
+        while True:
+            embed_data, content = await self._queue.get()
+            try:
+                await self.send_webhook_message(embed_data, content)
+            finally:
+                self._queue.task_done()
+    
+    async def close(self):
+        """Send any queued messages, then close the shared HTTP session"""
+        if self._sender_task is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), _QUEUE_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️ Dropping %s queued webhook messages", self._queue.qsize())
+            self._sender_task.cancel()
+            self._sender_task = None
+            self._queue = None
+        
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
     async def send_webhook_message(self, embed_data: dict, content: str = None) -> bool:
         """Send message via Discord webhook"""
+        cache_key = f"webhook:{self.webhook_url}"
+        if cache.get(cache_key) is MISSING:
+            logger.warning("⚠️ Skipping webhook message, webhook was recently rejected")
+            return False
+        
         try:
             payload = {"embeds": [embed_data]}
             if content:
                 payload["content"] = content
+            # Encoded straight to bytes once, and reused if the post has to be retried
+            body = _json_dumps(payload)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.webhook_url, json=payload) as response:
+            session = await self._get_session()
+            for attempt in range(_WEBHOOK_MAX_ATTEMPTS):
+                await _discord_bucket.acquire()
+                async with session.post(self.webhook_url, data=body, headers=_JSON_HEADERS) as response:
                     if response.status == 204:
+                        _discord_bucket.increase_rate()
                         logger.info("✅ Webhook message sent successfully")
                         return True
-                    else:
-                        logger.error(f"❌ Webhook failed with status: {response.status}")
+                    
+                    if response.status == 429:
+                        # Slows every following post down too, not just this retry
+                        _discord_bucket.decrease_rate()
+                    
+                    if response.status != 429 or attempt == _WEBHOOK_MAX_ATTEMPTS - 1:
+                        if response.status in _WEBHOOK_GONE_STATUSES:
+                            cache.set_missing(cache_key, _WEBHOOK_GONE_TTL)
+                        logger.error("❌ Webhook failed with status: %s", response.status)
                         return False
+                    
+                    retry_after = _retry_after(response)
+                    logger.warning("⚠️ Webhook rate limited, retrying in %.1fs", retry_after)
+                
+                # Wait outside the response context so the connection goes back to the pool
+                await asyncio.sleep(retry_after)
                         
         except Exception as e:
-            logger.error(f"❌ Failed to send webhook message: {e}")
+            logger.error("❌ Failed to send webhook message: %s", e)
             return False
     
     async def send_startup_notification(self) -> bool:
-        """Send bot startup notification"""
+        """Queue bot startup notification"""
         try:
+            now = local_now()
             embed = {
-                "title": "🤖 Bot Clan Storage Aktif",
-                "description": "Bot berhasil terhubung dan siap digunakan!",
-                "color": 0x00ff00,  # Green
-                "timestamp": datetime.now(Config.TIMEZONE).isoformat(),
-                "fields": [
-                    {
-                        "name": "📊 Status",
-                        "value": "✅ Online dan Siap",
-                        "inline": True
-                    },
+                **_STARTUP_EMBED,
+                "timestamp": now.isoformat(),
+                "fields": (
+                    _STARTUP_STATUS_FIELD,
                     {
                         "name": "⏰ Waktu Aktif",
-                        "value": datetime.now(Config.TIMEZONE).strftime('%Y-%m-%d %H:%M:%S WIB'),
+                        "value": now.strftime('%Y-%m-%d %H:%M:%S WIB'),
                         "inline": True
                     },
-                    {
-                        "name": "🛠️ Commands Available",
-                        "value": "• `/add_item` - Tambah item baru\n• `/list_items` - Lihat semua item\n• `/check_expiring` - Cek item expire\n• `/status` - Status bot",
-                        "inline": False
-                    }
-                ],
-                "footer": {
-                    "text": "Clan Storage Bot v1.0"
-                }
+                    _STARTUP_COMMANDS_FIELD
+                )
             }
             
-            return await self.send_webhook_message(embed)
+            return self.queue_webhook_message(embed)
             
         except Exception as e:
-            logger.error(f"❌ Failed to send startup notification: {e}")
+            logger.error("❌ Failed to send startup notification: %s", e)
             return False
     
     async def send_expiring_items_alert(self, expiring_items: List[Dict]) -> bool:
@@ -84,10 +211,14 @@ class NotificationManager:
                     if participant_name:
                         participant_names.add(participant_name)
             
+            # One snapshot for every countdown and timestamp in this alert
+            now = local_now()
+            now_iso = now.isoformat()
+            
             # Format items list
             items_list = []
             for item in expiring_items:
-                days_until_expire = (item['expire_date'] - datetime.now(Config.TIMEZONE)).days
+                days_until_expire = (item['expire_date'] - now).days
                 
                 if days_until_expire <= 0:
                     status_emoji = "🔴"
@@ -108,7 +239,7 @@ class NotificationManager:
                 "title": "⚠️ PERINGATAN: Item Akan Expire!",
                 "description": f"Ada **{len(expiring_items)}** item yang akan expire dalam {Config.NOTIFICATION_DAYS_BEFORE} hari:",
                 "color": 0xff6600,  # Orange
-                "timestamp": datetime.now(Config.TIMEZONE).isoformat(),
+                "timestamp": now_iso,
                 "fields": [
                     {
                         "name": "📦 Daftar Item",
@@ -139,11 +270,10 @@ class NotificationManager:
             
             # If there are more than 10 items, send additional embeds
             if len(expiring_items) > 10:
-                remaining_items = items_list[10:]
-                chunks = [remaining_items[i:i+10] for i in range(0, len(remaining_items), 10)]
+                chunks = chunk_list(islice(items_list, 10, None), 10)
                 
-                for i, chunk in enumerate(chunks, 1):
-                    additional_embed = {
+                additional_embeds = [
+                    {
                         "title": f"⚠️ Item Expire - Lanjutan ({i})",
                         "description": f"Item lainnya yang akan expire:",
                         "color": 0xff6600,
@@ -154,28 +284,37 @@ class NotificationManager:
                                 "inline": False
                             }
                         ],
-                        "timestamp": datetime.now(Config.TIMEZONE).isoformat()
+                        "timestamp": now_iso
                     }
-                    
-                    await self.send_webhook_message(additional_embed)
+                    for i, chunk in enumerate(chunks, 1)
+                ]
+                
+                # Continuations are numbered in their titles, so they can be posted concurrently
+                results = await asyncio.gather(
+                    *(self.send_webhook_message(additional_embed) for additional_embed in additional_embeds),
+                    return_exceptions=True
+                )
+                failed = sum(1 for result in results if result is not True)
+                if failed:
+                    logger.warning("⚠️ %s of %d continuation alerts failed", failed, len(additional_embeds))
             
             if success:
-                logger.info(f"📢 Expiring items alert sent for {len(expiring_items)} items")
+                logger.info("📢 Expiring items alert sent for %d items", len(expiring_items))
             
             return success
             
         except Exception as e:
-            logger.error(f"❌ Failed to send expiring items alert: {e}")
+            logger.error("❌ Failed to send expiring items alert: %s", e)
             return False
     
     async def send_item_added_notification(self, nama_item: str, item_type: str, participant: str, added_by: str) -> bool:
-        """Send notification when new item is added"""
+        """Queue notification when new item is added"""
         try:
             embed = {
                 "title": "✅ Item Baru Ditambahkan",
                 "description": f"Item baru telah ditambahkan ke storage clan",
                 "color": 0x00ff00,  # Green
-                "timestamp": datetime.now(Config.TIMEZONE).isoformat(),
+                "timestamp": local_now().isoformat(),
                 "fields": [
                     {
                         "name": "📦 Nama Item",
@@ -208,61 +347,45 @@ class NotificationManager:
                 }
             }
             
-            return await self.send_webhook_message(embed)
+            return self.queue_webhook_message(embed)
             
         except Exception as e:
-            logger.error(f"❌ Failed to send item added notification: {e}")
+            logger.error("❌ Failed to send item added notification: %s", e)
             return False
     
     async def send_error_notification(self, error_message: str, context: str = None) -> bool:
-        """Send error notification to webhook"""
+        """Queue error notification to webhook"""
         try:
-            embed = {
-                "title": "❌ Bot Error",
-                "description": "Terjadi kesalahan pada bot",
-                "color": 0xff0000,  # Red
-                "timestamp": datetime.now(Config.TIMEZONE).isoformat(),
-                "fields": [
-                    {
-                        "name": "🐛 Error Message",
-                        "value": f"```{error_message[:1000]}```",  # Limit to 1000 chars
-                        "inline": False
-                    }
-                ]
-            }
+            fields = [
+                {
+                    "name": "🐛 Error Message",
+                    "value": f"```{error_message[:1000]}```",  # Limit to 1000 chars
+                    "inline": False
+                }
+            ]
             
             if context:
-                embed["fields"].append({
+                fields.append({
                     "name": "📍 Context",
                     "value": context,
                     "inline": False
                 })
             
-            embed["footer"] = {
-                "text": "Bot mungkin memerlukan restart atau perbaikan"
-            }
+            embed = {**_ERROR_EMBED, "timestamp": local_now().isoformat(), "fields": fields}
             
-            return await self.send_webhook_message(embed)
+            return self.queue_webhook_message(embed)
             
         except Exception as e:
-            logger.error(f"❌ Failed to send error notification: {e}")
+            logger.error("❌ Failed to send error notification: %s", e)
             return False
     
     async def test_webhook(self) -> bool:
         """Test webhook connection"""
         try:
-            embed = {
-                "title": "🧪 Test Webhook",
-                "description": "Webhook berfungsi dengan baik!",
-                "color": 0x0099ff,  # Blue
-                "timestamp": datetime.now(Config.TIMEZONE).isoformat(),
-                "footer": {
-                    "text": "Test notification"
-                }
-            }
+            embed = {**_TEST_EMBED, "timestamp": local_now().isoformat()}
             
             return await self.send_webhook_message(embed)
             
         except Exception as e:
-            logger.error(f"❌ Webhook test failed: {e}")
+            logger.error("❌ Webhook test failed: %s", e)
             return False
\ No newline at end of file
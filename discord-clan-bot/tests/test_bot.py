@@ -1,7 +1,9 @@
 import pytest
 import asyncio
+import json
+import time
 from unittest.mock import Mock, AsyncMock, patch
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 from config import Config
 from database import DatabaseManager
@@ -14,17 +16,238 @@ class TestDatabaseManager:
         with patch('database.gspread'):
             return DatabaseManager()
     
-    def test_get_next_number(self, db_manager):
+    @pytest.mark.asyncio
+    async def test_get_next_number(self, db_manager):
         """Test getting next sequential number"""
         with patch.object(db_manager, 'worksheet') as mock_worksheet:
-            mock_worksheet.get_all_values.return_value = [
-                ['No', 'Nama Item', 'Type'],  # Header
-                ['1', 'Item 1', 'UNIQUE'],
-                ['2', 'Item 2', 'RED']
-            ]
+            mock_worksheet.get.return_value = [[1], [2], ['note']]  # Unformatted No column
             
-            next_no = db_manager._get_next_number()
+            next_no = await db_manager._get_next_number()
             assert next_no == 3
+            
+            # Subsequent numbers come from the in-memory counter
+            assert await db_manager._get_next_number() == 4
+            mock_worksheet.get.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_failed_scan_is_not_kept(self, db_manager):
+        """Test a failed No scan fails the add and the next add rescans"""
+        with patch.object(db_manager, 'worksheet') as mock_worksheet:
+            mock_worksheet.get.side_effect = [ConnectionError('offline'), [[n] for n in range(1, 101)]]
+            
+            assert await db_manager.add_item('Sword', 'RED', 'Player1') == False
+            assert db_manager._next_no is None
+            mock_worksheet.spreadsheet.values_append.assert_not_called()
+            
+            assert await db_manager.add_item('Shield', 'RED', 'Player1') == True
+            _, kwargs = mock_worksheet.spreadsheet.values_append.call_args
+            assert kwargs['body']['values'][0][0] == 101
+    
+    def test_ensure_headers_single_request(self, db_manager):
+        """Test headers and counter are read from one batch request"""
+        mock_spreadsheet = Mock()
+        mock_spreadsheet.values_batch_get.return_value = {'valueRanges': [
+            {'values': [DatabaseManager.HEADERS]},
+            {'values': [[1], [5]]}
+        ]}
+        
+        with patch.object(db_manager, 'worksheet') as mock_worksheet:
+            db_manager._ensure_headers(mock_spreadsheet)
+            
+            mock_spreadsheet.values_batch_get.assert_called_once()
+            mock_worksheet.update.assert_not_called()
+            assert db_manager._next_no == 6
+    
+    @pytest.mark.asyncio
+    async def test_add_item_appends_row(self, db_manager):
+        """Test add_item writes a single row through values_append"""
+        created_at = datetime(2024, 1, 15, 14, 30, 0, tzinfo=Config.TIMEZONE)
+        db_manager._next_no = 7
+        
+        with patch.object(db_manager, 'worksheet') as mock_worksheet:
+            assert await db_manager.add_item('Sword', 'unique', 'Player1', created_at) == True
+            
+            _, kwargs = mock_worksheet.spreadsheet.values_append.call_args
+            assert kwargs['params']['valueInputOption'] == 'RAW'
+            assert kwargs['body']['values'] == [[
+                7, 'Sword', 'UNIQUE', 'Player1', '2024-01-15 14:30:00', '2024-01-15 14:30:00', '2024-02-14 14:30:00'
+            ]]
+            assert db_manager._next_no == 8
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_adds_are_batched(self, db_manager):
+        """Test adds queued while a flush is running share one append"""
+        db_manager._next_no = 1
+        
+        with patch.object(db_manager, 'worksheet') as mock_worksheet:
+            results = await asyncio.gather(*(
+                db_manager.add_item(f'Item {i}', 'RED', 'Player1') for i in range(3)
+            ))
+            await db_manager.flush()
+            
+            assert results == [True, True, True]
+            appended = [
+                row[0] for call in mock_worksheet.spreadsheet.values_append.call_args_list
+                for row in call.kwargs['body']['values']
+            ]
+            assert appended == [1, 2, 3]
+            assert mock_worksheet.spreadsheet.values_append.call_count < 3
+    
+    def test_sheets_call_retries_rate_limit(self, db_manager):
+        """Test 429 responses are retried and other errors are raised"""
+        from gspread.exceptions import APIError
+        
+        def api_error(status):
+            response = Mock(status_code=status)
+            response.json.return_value = {'error': {'code': status, 'message': 'error', 'status': 'ERROR'}}
+            return APIError(response)
+        
+        func = Mock(side_effect=[api_error(429), 'ok'])
+        with patch('database.time.sleep') as mock_sleep:
+            assert db_manager._sheets_call(func) == 'ok'
+            mock_sleep.assert_called_once()
+        
+        func = Mock(side_effect=api_error(400))
+        with pytest.raises(APIError):
+            db_manager._sheets_call(func)
+        func.assert_called_once()
+        
+        func = Mock(side_effect=[api_error(500), 'ok'])
+        with pytest.raises(APIError):
+            db_manager._sheets_call(func, idempotent=False)
+    
+    @pytest.mark.asyncio
+    async def test_get_all_items_uses_cache(self, db_manager):
+        """Test records are fetched once within the cache TTL"""
+        with patch.object(db_manager, 'worksheet') as mock_worksheet:
+            mock_worksheet.get.return_value = [
+                [1, 'Item 1', 'UNIQUE', 'Player1', '2024-01-01 10:00:00', '2024-01-01 10:00:00', '2024-01-31 10:00:00'],
+                [2, 'Incomplete row']
+            ]
+            
+            items = await db_manager.get_all_items()
+            assert items == await db_manager.get_all_items()
+            assert len(items) == 1
+            assert items[0]['Nama Item'] == 'Item 1'
+            assert items[0]['Expire'] == '2024-01-31 10:00:00'
+            mock_worksheet.get.assert_called_once()
+            
+            db_manager._invalidate_cache()
+            await db_manager.get_all_items()
+            assert mock_worksheet.get.call_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_write_during_fetch_is_not_cached(self, db_manager):
+        """Test a fetch that overlaps an append is not served from cache afterwards"""
+        row = [1, 'Item 1', 'UNIQUE', 'Player1', '2024-01-01 10:00:00', '2024-01-01 10:00:00', '2024-01-31 10:00:00']
+        
+        with patch.object(db_manager, 'worksheet') as mock_worksheet:
+            def stale_read(*args, **kwargs):
+                # The append lands while this read is still in flight
+                db_manager._invalidate_cache()
+                return [row]
+            
+            mock_worksheet.get.side_effect = stale_read
+            assert len(await db_manager.get_all_items()) == 1
+            
+            # A fresh timestamp alone must not revive the stale rows
+            db_manager._records_cache_ts = time.monotonic()
+            
+            mock_worksheet.get.side_effect = None
+            mock_worksheet.get.return_value = [row, [2] + row[1:]]
+            assert len(await db_manager.get_all_items()) == 2
+    
+    @pytest.mark.asyncio
+    async def test_counter_only_updated_on_loop(self, db_manager):
+        """Test the worker-side fetch leaves the item counter to the loop thread"""
+        row = [4, 'Item 4', 'UNIQUE', 'Player1', '2024-01-01 10:00:00', '2024-01-01 10:00:00', '2024-01-31 10:00:00']
+        db_manager._next_no = 2
+        
+        with patch.object(db_manager, 'worksheet') as mock_worksheet:
+            mock_worksheet.get.return_value = [row]
+            
+            # What runs in the Sheets pool only reports the max, it never writes the counter
+            _, _, max_no = db_manager._get_records()
+            assert max_no == 4
+            assert db_manager._next_no == 2
+            
+            await db_manager.get_all_items()
+            assert db_manager._next_no == 5
+            
+            # A counter already ahead of the sheet is never moved back
+            db_manager._next_no = 9
+            await db_manager.get_all_items()
+            assert await db_manager._get_next_number() == 9
+    
+    @pytest.mark.asyncio
+    async def test_get_expiring_items_sorted(self, db_manager):
+        """Test expiring items come from the sorted index up to the cutoff"""
+        later = (datetime.now() + timedelta(days=4)).strftime('%Y-%m-%d %H:%M:%S')
+        sooner = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+        outside = (datetime.now() + timedelta(days=20)).strftime('%Y-%m-%d %H:%M:%S')
+        
+        with patch.object(db_manager, 'worksheet') as mock_worksheet:
+            mock_worksheet.get.return_value = [
+                [1, 'Item 1', 'UNIQUE', 'Player1', later, later, later],
+                [2, 'Item 2', 'RED', 'Player2', outside, outside, outside],
+                [3, 'Item 3', 'RED', 'Player3', sooner, sooner, sooner],
+                [4, 'Item 4', 'RED', 'Player4', 'bad', 'bad', 'bad']
+            ]
+            
+            items = await db_manager.get_expiring_items()
+            assert [item['no'] for item in items] == [3, 1]
+    
+    @pytest.mark.asyncio
+    async def test_get_stats(self, db_manager):
+        """Test total and expiring counts come from one fetch"""
+        soon = (datetime.now() + timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S')
+        later = (datetime.now() + timedelta(days=20)).strftime('%Y-%m-%d %H:%M:%S')
+        
+        with patch.object(db_manager, 'worksheet') as mock_worksheet:
+            mock_worksheet.get.return_value = [
+                [1, 'Item 1', 'UNIQUE', 'Player1', soon, soon, soon],
+                [2, 'Item 2', 'RED', 'Player2', later, later, later]
+            ]
+            
+            assert await db_manager.get_stats() == (2, 1)
+            mock_worksheet.get.assert_called_once()
+    
+    def test_cached_token_round_trip(self, db_manager, tmp_path):
+        """Test a saved access token is reused only while it is still valid"""
+        token_path = str(tmp_path / 'token.json')
+        utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+        creds = Mock(service_account_email='bot@example.com', token='abc', expiry=utc_now + timedelta(minutes=30))
+        
+        with patch.object(DatabaseManager, '_TOKEN_CACHE_PATH', token_path):
+            db_manager._save_cached_token(creds)
+            
+            fresh = Mock(service_account_email='bot@example.com', token=None, expiry=None)
+            db_manager._load_cached_token(fresh)
+            assert fresh.token == 'abc'
+            
+            other = Mock(service_account_email='other@example.com', token=None, expiry=None)
+            db_manager._load_cached_token(other)
+            assert other.token is None
+            
+            creds.expiry = utc_now + timedelta(seconds=30)
+            db_manager._save_cached_token(creds)
+            stale = Mock(service_account_email='bot@example.com', token=None, expiry=None)
+            db_manager._load_cached_token(stale)
+            assert stale.token is None
+    
+    def test_default_credentials_token_not_cached(self, tmp_path):
+        """Test tokens from default (ADC/GCE) credentials are not written to disk"""
+        token_path = tmp_path / 'token.json'
+        creds = Mock(service_account_email='default', token='abc', expiry=datetime(2099, 1, 1))
+        
+        with patch('database.gspread') as mock_gspread, \
+             patch('database.default', return_value=(creds, None)), \
+             patch('database.os.path.exists', return_value=False), \
+             patch.object(DatabaseManager, '_TOKEN_CACHE_PATH', str(token_path)):
+            mock_gspread.authorize.return_value.auth = creds
+            DatabaseManager()
+        
+        assert not token_path.exists()
     
     def test_validate_item_type(self):
         """Test item type validation"""
@@ -45,6 +268,9 @@ class TestDatabaseManager:
         
         result = sanitize_participant_names("Player1,,Player2,")
         assert result == "Player1, Player2"
+        
+        result = sanitize_participant_names("Player2, Player1, Player2 ,Player1")
+        assert result == "Player2, Player1"
 
 
 class TestNotificationManager:
@@ -58,7 +284,9 @@ class TestNotificationManager:
         with patch('aiohttp.ClientSession') as mock_session:
             mock_response = AsyncMock()
             mock_response.status = 204
-            mock_session.return_value.__aenter__.return_value.post.return_value.__aenter__.return_value = mock_response
+            mock_session.return_value.closed = False
+            mock_session.return_value.post.return_value.__aenter__.return_value = mock_response
+            mock_session.return_value.close = AsyncMock()
             
             embed_data = {
                 "title": "Test",
@@ -68,6 +296,72 @@ class TestNotificationManager:
             
             result = await notification_manager.send_webhook_message(embed_data)
             assert result == True
+            
+            # The payload goes out as pre-encoded JSON bytes
+            _, kwargs = mock_session.return_value.post.call_args
+            assert json.loads(kwargs['data']) == {"embeds": [embed_data]}
+            assert kwargs['headers']['Content-Type'] == 'application/json'
+            
+            # The session is reused across sends until close()
+            assert await notification_manager.send_webhook_message(embed_data) == True
+            mock_session.assert_called_once()
+            
+            await notification_manager.close()
+            mock_session.return_value.close.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_queued_messages_are_sent_in_order(self, notification_manager):
+        """Test queued notifications return immediately and are drained by close()"""
+        sent = []
+        
+        async def fake_send(embed_data, content=None):
+            sent.append(embed_data['title'])
+            return True
+        
+        with patch.object(notification_manager, 'send_webhook_message', side_effect=fake_send):
+            assert await notification_manager.send_startup_notification() == True
+            assert await notification_manager.send_error_notification('boom', 'Test') == True
+            
+            await notification_manager.close()
+            assert sent == ['🤖 Bot Clan Storage Aktif', '❌ Bot Error']
+    
+    @pytest.mark.asyncio
+    async def test_rejected_webhook_is_skipped(self, notification_manager):
+        """Test a 404 from the webhook is cached so following sends skip the request"""
+        from utils import cache
+        
+        with patch('aiohttp.ClientSession') as mock_session:
+            mock_response = AsyncMock()
+            mock_response.status = 404
+            mock_session.return_value.closed = False
+            mock_session.return_value.post.return_value.__aenter__.return_value = mock_response
+            
+            try:
+                assert await notification_manager.send_webhook_message({"title": "Test"}) == False
+                assert await notification_manager.send_webhook_message({"title": "Test"}) == False
+                mock_session.return_value.post.assert_called_once()
+            finally:
+                cache.clear()
+    
+    @pytest.mark.asyncio
+    async def test_rate_limited_webhook_honors_retry_after(self, notification_manager):
+        """Test a 429 is retried after the Retry-After delay Discord sends"""
+        with patch('aiohttp.ClientSession') as mock_session, \
+             patch('notifications._discord_bucket', Mock(acquire=AsyncMock())) as mock_bucket, \
+             patch('notifications.asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+            limited = AsyncMock(status=429, headers={'Retry-After': '2.5'})
+            sent = AsyncMock(status=204)
+            mock_session.return_value.closed = False
+            mock_session.return_value.post.return_value.__aenter__.side_effect = [limited, sent]
+            
+            assert await notification_manager.send_webhook_message({"title": "Test"}) == True
+            mock_sleep.assert_awaited_once_with(2.5)
+            assert mock_session.return_value.post.call_count == 2
+            
+            # The 429 slows the shared bucket down, the success speeds it back up
+            mock_bucket.decrease_rate.assert_called_once()
+            mock_bucket.increase_rate.assert_called_once()
+            assert mock_bucket.acquire.await_count == 2
     
     @pytest.mark.asyncio
     async def test_send_expiring_items_alert(self, notification_manager):
@@ -86,6 +380,21 @@ class TestNotificationManager:
             result = await notification_manager.send_expiring_items_alert(expiring_items)
             assert result == True
             mock_send.assert_called()
+    
+    @pytest.mark.asyncio
+    async def test_send_expiring_items_alert_continuations(self, notification_manager):
+        """Test items beyond the first 10 are sent as numbered continuation embeds"""
+        expire_date = datetime.now(Config.TIMEZONE) + timedelta(days=3)
+        expiring_items = [
+            {'no': i, 'nama_item': f'Item {i}', 'type': 'RED', 'participant': 'Player1', 'expire_date': expire_date}
+            for i in range(25)
+        ]
+        
+        with patch.object(notification_manager, 'send_webhook_message', return_value=True) as mock_send:
+            assert await notification_manager.send_expiring_items_alert(expiring_items) == True
+            
+            titles = [call.args[0]['title'] for call in mock_send.call_args_list[1:]]
+            assert titles == ['⚠️ Item Expire - Lanjutan (1)', '⚠️ Item Expire - Lanjutan (2)']
 
 
 class TestUtils:
@@ -94,7 +403,7 @@ class TestUtils:
         from utils import format_datetime
         
         dt = datetime(2024, 1, 15, 14, 30, 0)
-        dt_with_tz = Config.TIMEZONE.localize(dt)
+        dt_with_tz = dt.replace(tzinfo=Config.TIMEZONE)
         
         result = format_datetime(dt_with_tz, 'full')
         assert '2024-01-15 14:30:00 WIB' in result
@@ -102,6 +411,31 @@ class TestUtils:
         result = format_datetime(dt_with_tz, 'date')
         assert result == '2024-01-15'
     
+    def test_parse_sheet_datetime(self):
+        """Test fast sheet timestamp parsing matches strptime"""
+        from utils import parse_sheet_datetime
+        
+        value = '2024-01-15 14:30:05'
+        assert parse_sheet_datetime(value) == datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+        
+        assert parse_sheet_datetime(45306.5) == datetime(2024, 1, 15, 12, 0, 0)
+        assert parse_sheet_datetime(value, Config.TIMEZONE).tzinfo is Config.TIMEZONE
+        
+        with pytest.raises(ValueError):
+            parse_sheet_datetime('not a date')
+    
+    def test_parse_date_input(self):
+        """Test ISO fast path and fallback formats agree"""
+        from utils import parse_date_input
+        
+        assert parse_date_input('2024-01-15').date() == datetime(2024, 1, 15).date()
+        assert parse_date_input('2024-1-5').date() == datetime(2024, 1, 5).date()
+        assert parse_date_input('15/01/2024').date() == datetime(2024, 1, 15).date()
+        assert parse_date_input('15.01.2024').tzinfo is Config.TIMEZONE
+        
+        with pytest.raises(ValueError):
+            parse_date_input('2024-02-30')
+    
     def test_get_item_status_emoji(self):
         """Test item status emoji"""
         from utils import get_item_status_emoji
@@ -110,13 +444,58 @@ class TestUtils:
         assert get_item_status_emoji(1) == "🔴"   # Critical
         assert get_item_status_emoji(5) == "🟡"   # Warning
         assert get_item_status_emoji(10) == "🟢"  # Safe
+        
+        # Thresholds belong to the more urgent bucket
+        assert get_item_status_emoji(0) == "🔴"
+        assert get_item_status_emoji(3) == "🔴"
+        assert get_item_status_emoji(4) == "🟡"
+        assert get_item_status_emoji(7) == "🟡"
+        assert get_item_status_emoji(8) == "🟢"
+    
+    def test_console_safe_formatter(self):
+        """Test console formatter strips emoji the console can't encode"""
+        import logging
+        from utils import ConsoleSafeFormatter
+        
+        record = logging.LogRecord('bot', logging.INFO, __file__, 1, "✅ Ready: %s", ('Bot',), None)
+        formatter = ConsoleSafeFormatter('%(message)s')
+        
+        with patch('utils._USE_EMOJI', True):
+            assert formatter.format(record) == "✅ Ready: Bot"
+        
+        with patch('utils._USE_EMOJI', False), patch('utils._CONSOLE_ENCODING', 'cp1252'):
+            assert formatter.format(record) == " Ready: Bot"
+    
+    @pytest.mark.asyncio
+    async def test_log_command_usage(self, caplog):
+        """Test command usage is logged and the wrapped result passed through"""
+        import logging
+        from utils import log_command_usage
+        
+        @log_command_usage
+        async def command(interaction):
+            return 'done'
+        
+        interaction = Mock(data={'name': 'status'})
+        interaction.user.display_name = 'Player1'
+        interaction.user.id = 123
+        
+        with caplog.at_level(logging.INFO, logger='utils'):
+            assert await command(interaction) == 'done'
+        assert "Command 'status' used by Player1 (ID: 123)" in caplog.text
+        
+        # Objects without interaction attributes are passed through unlogged
+        caplog.clear()
+        with caplog.at_level(logging.INFO, logger='utils'):
+            assert await command(object()) == 'done'
+        assert caplog.text == ''
     
     def test_chunk_list(self):
         """Test list chunking"""
         from utils import chunk_list
         
         test_list = list(range(10))
-        chunks = chunk_list(test_list, 3)
+        chunks = list(chunk_list(test_list, 3))
         
         assert len(chunks) == 4
         assert chunks[0] == [0, 1, 2]
@@ -127,9 +506,10 @@ class TestUtils:
         from utils import is_user_authorized
         
         # Mock authorized users
-        with patch.object(Config, 'AUTHORIZED_USERS', ['123456789', '987654321']):
+        with patch.object(Config, 'AUTHORIZED_USERS', frozenset({123456789, 987654321})):
             assert is_user_authorized('123456789') == True
             assert is_user_authorized('999999999') == False
+            assert is_user_authorized(987654321) == True
 
 
 class TestRateLimiter:
@@ -148,6 +528,43 @@ class TestRateLimiter:
         
         # Different user should be allowed
         assert limiter.is_allowed('user2') == True
+    
+    def test_rate_limiter_window_expiry(self):
+        """Test calls older than the window stop counting, even across long gaps"""
+        from utils import RateLimiter
+        
+        limiter = RateLimiter(max_calls=1, time_window=60)
+        
+        with patch('utils.time.monotonic', return_value=1000.0):
+            assert limiter.is_allowed('user1') == True
+            assert limiter.is_allowed('user1') == False
+        
+        # A gap of over a day must not wrap around like timedelta.seconds did
+        with patch('utils.time.monotonic', return_value=1000.0 + 86400 + 30):
+            assert limiter.is_allowed('user1') == True
+
+
+class TestAdaptiveTokenBucket:
+    @pytest.mark.asyncio
+    async def test_bucket_adapts_rate(self):
+        """Test the bucket waits for tokens and backs off when rate limited"""
+        import time
+        from utils import AdaptiveTokenBucket
+        
+        bucket = AdaptiveTokenBucket(rate=100.0, capacity=1.0, max_rate=200.0)
+        await bucket.acquire()
+        
+        # The bucket is empty, so the next token takes about 1/rate seconds to arrive
+        started = time.monotonic()
+        await bucket.acquire()
+        assert time.monotonic() - started >= 0.005
+        
+        bucket.increase_rate()
+        assert bucket.rate == pytest.approx(100.1)
+        
+        bucket.decrease_rate()
+        assert bucket.rate == pytest.approx(50.05)
+        assert bucket.tokens == 0
 
 
 class TestCache:
@@ -172,6 +589,37 @@ class TestCache:
         import time
         time.sleep(1.1)
         assert cache.get('key2') is None
+        
+        # Cached absences are distinct from unknown keys
+        from utils import MISSING
+        cache.set_missing('key3')
+        assert cache.get('key3') is MISSING
+    
+    def test_cache_cleanup_and_size_cap(self):
+        """Test cleanup drops only expired entries and the size cap evicts least recently used"""
+        from utils import Cache
+        
+        cache = Cache(default_ttl=300, max_size=2)
+        
+        with patch('utils.time.monotonic', return_value=100.0):
+            cache.set('short', 1, ttl=10)
+            cache.set('long', 2)
+            # Re-setting with a longer TTL supersedes the old heap entry
+            cache.set('short', 3, ttl=60)
+        
+        with patch('utils.time.monotonic', return_value=120.0):
+            cache.cleanup()
+            assert cache.get('short') == 3
+            
+            # 'long' is now least recently used and is evicted first
+            cache.set('new', 4)
+            assert cache.get('long') is None
+            assert cache.get('short') == 3
+        
+        with patch('utils.time.monotonic', return_value=170.0):
+            cache.cleanup()
+            assert 'short' not in cache.cache
+            assert cache.get('new') == 4
 
 
 class TestConfig:
@@ -186,16 +634,22 @@ class TestConfig:
         with patch('os.path.exists', return_value=False):
             with pytest.raises(ValueError, match="Google credentials file not found"):
                 Config.validate()
+        
+        # Mock empty authorized users
+        with patch.object(Config, 'AUTHORIZED_USERS', frozenset()):
+            with pytest.raises(ValueError, match="AUTHORIZED_USERS must be set"):
+                Config.validate()
 
 
 @pytest.mark.asyncio
-async def test_bot_startup():
+async def test_bot_startup(tmp_path):
     """Test bot startup process"""
     from bot import ClanStorageBot
     
     with patch('bot.DatabaseManager'), \
          patch('bot.NotificationManager'), \
          patch.object(Config, 'validate'), \
+         patch('bot.COMMAND_DIGEST_PATH', str(tmp_path / '.cmd_digest')), \
          patch('discord.ext.commands.Bot.tree') as mock_tree:
         
         bot = ClanStorageBot()
@@ -204,7 +658,106 @@ async def test_bot_startup():
         # Test setup hook
         await bot.setup_hook()
         mock_tree.sync.assert_called_once()
+        
+        # Unchanged commands are not synced again
+        assert await bot._sync_commands_if_changed() == False
+        mock_tree.sync.assert_called_once()
+
 
 
+@pytest.mark.asyncio
+async def test_item_pager_view():
+    """Test list_items paging buttons, foreign clicks and timeout"""
+    import discord
+    from bot import ItemPagerView
+    
+    embeds = [discord.Embed(title=f'Page {i}') for i in range(3)]
+    view = ItemPagerView(embeds, author_id=1)
+    assert view.previous_page.disabled and not view.next_page.disabled
+    
+    interaction = Mock()
+    interaction.response.edit_message = AsyncMock()
+    
+    await view.next_page.callback(interaction)
+    interaction.response.edit_message.assert_awaited_with(embed=embeds[1], view=view)
+    await view.next_page.callback(interaction)
+    interaction.response.edit_message.assert_awaited_with(embed=embeds[2], view=view)
+    assert view.next_page.disabled and not view.previous_page.disabled
+    
+    await view.previous_page.callback(interaction)
+    interaction.response.edit_message.assert_awaited_with(embed=embeds[1], view=view)
+    
+    # Someone else's click gets an ephemeral answer instead of failing silently
+    foreign = Mock()
+    foreign.user.id = 2
+    foreign.response.send_message = AsyncMock()
+    assert await view.interaction_check(foreign) == False
+    assert foreign.response.send_message.await_args.kwargs['ephemeral'] == True
+    
+    view.message = Mock(edit=AsyncMock())
+    await view.on_timeout()
+    assert all(item.disabled for item in view.children)
+    view.message.edit.assert_awaited_once_with(view=view)
+
+
+def test_invalid_type_embed_order():
+    """Test the invalid-type message lists types in the documented order"""
+    from bot import _INVALID_TYPE_EMBED
+    
+    assert _INVALID_TYPE_EMBED.description.endswith("UNIQUE, RED, CONSUMABLE")
+
+
+@pytest.mark.asyncio
+async def test_list_items_skips_bad_expire():
+    """Test one malformed Expire cell doesn't fail the whole list"""
+    import bot as bot_module
+    
+    items = [
+        {'No': 1, 'Nama Item': 'Sword', 'Type': 'RED', 'Participant': 'Player1', 'Expire': 'not a date'},
+        {'No': 2, 'Nama Item': 'Shield', 'Type': 'RED', 'Participant': 'Player1', 'Expire': '2099-01-01 10:00:00'}
+    ]
+    interaction = Mock()
+    interaction.response.defer = AsyncMock()
+    interaction.followup.send = AsyncMock()
+    
+    with patch.object(bot_module.bot, 'db') as mock_db:
+        mock_db.get_all_items = AsyncMock(return_value=items)
+        await bot_module.list_items.callback(interaction)
+    
+    embed = interaction.followup.send.await_args.kwargs['embed']
+    assert [field.name for field in embed.fields] == ['⚪ 1. Sword (RED)', '🟢 2. Shield (RED)']
+    assert 'tidak valid' in embed.fields[0].value
+
+
+@pytest.mark.asyncio
+async def test_shutdown_drains_notifications():
+    """Test shutdown sends queued notifications and closes the webhook session once"""
+    from main import BotManager
+    
+    manager = BotManager()
+    manager.bot = Mock(is_closed=Mock(return_value=False), close=AsyncMock())
+    manager.bot.db.flush = AsyncMock()
+    manager.notifications = NotificationManager()
+    manager.running = True
+    
+    sent = []
+    
+    async def fake_send(embed_data, content=None):
+        sent.append(embed_data['title'])
+        return True
+    
+    session = Mock(closed=False, close=AsyncMock())
+    manager.notifications._session = session
+    
+    with patch.object(manager.notifications, 'send_webhook_message', side_effect=fake_send):
+        await manager.notifications.send_startup_notification()
+        
+        # A signal-triggered shutdown and main()'s own await share one run
+        await asyncio.gather(manager.shutdown(), manager.shutdown())
+    
+    assert sent == ['🤖 Bot Clan Storage Aktif', '🛑 Bot Shutdown']
+    manager.bot.close.assert_awaited_once()
+    session.close.assert_awaited_once()
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
@@ -1,24 +1,65 @@
 import logging
 import functools
 import asyncio
-from datetime import datetime
-from typing import Any, Callable, Optional
+import bisect
+import heapq
+import platform
+import random
+import re
+import sys
+import time
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+_IS_WINDOWS = platform.system() == 'Windows'
+
+def _console_encoding() -> str:
+    """Encoding the console log handler will write with"""
+    if _IS_WINDOWS:
+        return 'cp1252'
+    return getattr(sys.stdout, 'encoding', None) or 'utf-8'
+
+# Resolved once at import so ConsoleSafeFormatter does no platform probing per call
+_CONSOLE_ENCODING = _console_encoding()
+_USE_EMOJI = _CONSOLE_ENCODING.lower().replace('-', '').startswith('utf')
+
+# Bound once so hot paths skip the datetime.now / Config.TIMEZONE lookups
+_TZ = Config.TIMEZONE
+_DT_NOW = datetime.now
+
+def local_now() -> datetime:
+    """Current time in the configured timezone"""
+    return _DT_NOW(_TZ)
+
+class ConsoleSafeFormatter(logging.Formatter):
+    """Formatter that drops characters the console encoding can't display (e.g. emoji on Windows)"""
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        if _USE_EMOJI:
+            return message
+        return message.encode(_CONSOLE_ENCODING, 'ignore').decode(_CONSOLE_ENCODING)
+
 def setup_logging():
     """Setup cross-platform logging configuration with Unicode support"""
     import os
-    import sys
-    import platform
     
     # Create logs directory
     os.makedirs('./logs', exist_ok=True)
     
+    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    
     # Configure console handler with proper encoding for Windows
     console_handler = logging.StreamHandler(sys.stdout)
+    # Emoji are stripped at the console only, the log file keeps full UTF-8 messages
+    console_handler.setFormatter(ConsoleSafeFormatter(log_format))
     
     # Set UTF-8 encoding for Windows console
-    if platform.system() == 'Windows':
+    if _IS_WINDOWS:
         try:
             # Try to set UTF-8 console encoding
             import codecs
@@ -31,7 +72,7 @@ def setup_logging():
     # Setup logging with file handler (always UTF-8) and console handler
     logging.basicConfig(
         level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        format=log_format,
         handlers=[
             logging.FileHandler('./logs/bot.log', encoding='utf-8'),
             console_handler
@@ -47,38 +88,37 @@ def log_command_usage(func: Callable) -> Callable:
     """Decorator to log command usage"""
     @functools.wraps(func)
     async def wrapper(*args, **kwargs):
-        # Get interaction from args (usually first argument)
-        interaction = args[0] if args else None
-        
-        if hasattr(interaction, 'user') and hasattr(interaction, 'data'):
-            command_name = interaction.data.get('name', 'unknown')
-            user_id = interaction.user.id
-            user_name = interaction.user.display_name
+        # Skip the attribute probing entirely when INFO is filtered out
+        if args and logger.isEnabledFor(logging.INFO):
+            # Get interaction from args (usually first argument)
+            interaction = args[0]
+            user = getattr(interaction, 'user', None)
+            data = getattr(interaction, 'data', None)
             
-            logger = logging.getLogger(__name__)
-            logger.info(f"🎮 Command '{command_name}' used by {user_name} (ID: {user_id})")
+            if user is not None and data is not None:
+                logger.info("🎮 Command '%s' used by %s (ID: %s)",
+                            data.get('name', 'unknown'), user.display_name, user.id)
         
         return await func(*args, **kwargs)
     
     return wrapper
 
-def retry_on_failure(max_retries: int = 3, delay: float = 1.0):
-    """Decorator to retry function on failure"""
+def retry_on_failure(max_retries: int = 3, delay: float = 1.0, max_delay: float = 30.0):
+    """Decorator to retry function on failure with jittered exponential backoff"""
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
-            logger = logging.getLogger(__name__)
-            
             for attempt in range(max_retries):
                 try:
                     return await func(*args, **kwargs)
                 except Exception as e:
                     if attempt == max_retries - 1:
-                        logger.error(f"❌ Function {func.__name__} failed after {max_retries} attempts: {e}")
+                        logger.error("❌ Function %s failed after %s attempts: %s", func.__name__, max_retries, e)
                         raise
                     else:
-                        logger.warning(f"⚠️ Attempt {attempt + 1} failed for {func.__name__}: {e}. Retrying...")
-                        await asyncio.sleep(delay * (attempt + 1))  # Exponential backoff
+                        logger.warning("⚠️ Attempt %s failed for %s: %s. Retrying...", attempt + 1, func.__name__, e)
+                        # Exponential backoff, jittered so concurrent callers don't retry in lockstep
+                        await asyncio.sleep(min(max_delay, delay * 2 ** attempt) * (0.5 + random.random()))
             
         return wrapper
     return decorator
@@ -86,7 +126,7 @@ def retry_on_failure(max_retries: int = 3, delay: float = 1.0):
 def format_datetime(dt: datetime, format_type: str = 'full') -> str:
     """Format datetime with timezone awareness"""
     if dt.tzinfo is None:
-        dt = Config.TIMEZONE.localize(dt)
+        dt = dt.replace(tzinfo=Config.TIMEZONE)
     
     local_dt = dt.astimezone(Config.TIMEZONE)
     
@@ -97,7 +137,7 @@ def format_datetime(dt: datetime, format_type: str = 'full') -> str:
     elif format_type == 'time':
         return local_dt.strftime('%H:%M:%S')
     elif format_type == 'relative':
-        now = datetime.now(Config.TIMEZONE)
+        now = local_now()
         diff = local_dt - now
         
         if diff.days > 0:
@@ -121,52 +161,73 @@ def validate_item_type(item_type: str) -> bool:
 def sanitize_participant_names(participants: str) -> str:
     """Sanitize and format participant names"""
     # Split by comma, strip whitespace, remove empty strings
-    names = [name.strip() for name in participants.split(',') if name.strip()]
-    
-    # Remove duplicates while preserving order
-    unique_names = []
-    for name in names:
-        if name not in unique_names:
-            unique_names.append(name)
+    names = (name.strip() for name in participants.split(','))
     
-    return ', '.join(unique_names)
+    # Remove duplicates while preserving order (dicts keep insertion order)
+    return ', '.join(dict.fromkeys(name for name in names if name))
 
 def calculate_expire_date(created_at: datetime) -> datetime:
     """Calculate expire date based on creation date"""
-    from datetime import timedelta
     return created_at + timedelta(days=Config.ITEM_EXPIRY_DAYS)
 
+# Day zero for Google Sheets serial date numbers
+SHEETS_EPOCH = datetime(1899, 12, 30)
+
+def parse_sheet_datetime(value, tzinfo=None) -> datetime:
+    """Parse a sheet timestamp ('YYYY-MM-DD HH:MM:SS' text or serial number), optionally attaching tzinfo"""
+    if isinstance(value, (int, float)):
+        # Unformatted date cells come back as days since the Sheets epoch
+        return (SHEETS_EPOCH + timedelta(days=value)).replace(tzinfo=tzinfo)
+    
+    # 'YYYY-MM-DD HH:MM:SS' is valid ISO 8601, and the C fromisoformat is far cheaper than strptime
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        # Let strptime raise the descriptive error for malformed cells
+        parsed = datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=tzinfo)
+
+# Most input is ISO, matched without going through strptime
+_ISO_DATE_RE = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})')
+
+# Other supported formats, tried in order
+_DATE_INPUT_FORMATS = (
+    '%d/%m/%Y',        # 15/01/2024
+    '%d-%m-%Y',        # 15-01-2024
+    '%Y/%m/%d',        # 2024/01/15
+    '%d.%m.%Y',        # 15.01.2024
+    '%d %m %Y',        # 15 01 2024
+)
+
 def parse_date_input(date_str: str) -> datetime:
     """Parse date input from various formats and return datetime with timezone"""
-    from datetime import datetime
-    import re
-    
     date_str = date_str.strip()
     
-    # Supported formats
-    formats = [
-        '%Y-%m-%d',        # 2024-01-15
-        '%d/%m/%Y',        # 15/01/2024
-        '%d-%m-%Y',        # 15-01-2024
-        '%Y/%m/%d',        # 2024/01/15
-        '%d.%m.%Y',        # 15.01.2024
-        '%d %m %Y',        # 15 01 2024
-    ]
-    
-    # Try each format
     parsed_date = None
-    for format_str in formats:
+    
+    # Fast path for 2024-01-15
+    match = _ISO_DATE_RE.fullmatch(date_str)
+    if match:
         try:
-            parsed_date = datetime.strptime(date_str, format_str)
-            break
+            parsed_date = datetime(*map(int, match.groups()))
         except ValueError:
-            continue
+            pass
+    
+    # Try each format
+    if not parsed_date:
+        for format_str in _DATE_INPUT_FORMATS:
+            try:
+                parsed_date = datetime.strptime(date_str, format_str)
+                break
+            except ValueError:
+                continue
     
     if not parsed_date:
         raise ValueError(f"Format tanggal tidak dikenali: '{date_str}'")
     
     # Set time to current time and add timezone
-    now = datetime.now(Config.TIMEZONE)
+    now = local_now()
     parsed_date = parsed_date.replace(
         hour=now.hour, 
         minute=now.minute, 
@@ -174,7 +235,7 @@ def parse_date_input(date_str: str) -> datetime:
     )
     
     # Add timezone info
-    parsed_date = Config.TIMEZONE.localize(parsed_date)
+    parsed_date = parsed_date.replace(tzinfo=Config.TIMEZONE)
     
     # Validate date is not in the future (more than today)
     today = now.date()
@@ -183,109 +244,162 @@ def parse_date_input(date_str: str) -> datetime:
     
     return parsed_date
 
+# Upper bounds (inclusive) in days for each status, and the emoji for each bucket
+_STATUS_THRESHOLDS = (0, 3, 7)
+_STATUS_EMOJIS = (
+    "🔴",  # Expired
+    "🔴",  # Critical
+    "🟡",  # Warning
+    "🟢",  # Safe
+)
+
 def get_item_status_emoji(days_until_expire: int) -> str:
     """Get status emoji based on days until expiration"""
-    if days_until_expire <= 0:
-        return "🔴"  # Expired
-    elif days_until_expire <= 3:
-        return "🔴"  # Critical
-    elif days_until_expire <= 7:
-        return "🟡"  # Warning
-    else:
-        return "🟢"  # Safe
-
-def safe_log_message(message: str, fallback_message: str = None) -> str:
-    """Create safe log message for cross-platform compatibility"""
-    import platform
-    
-    # On Windows, check if we can safely display Unicode
-    if platform.system() == 'Windows':
-        try:
-            # Test if message can be encoded with cp1252
-            message.encode('cp1252')
-            return message
-        except UnicodeEncodeError:
-            # Return fallback or sanitized version
-            if fallback_message:
-                return fallback_message
-            # Remove emojis and Unicode chars
-            import re
-            # Remove emoji and special Unicode characters
-            sanitized = re.sub(r'[^\x00-\x7F]+', '', message)
-            return sanitized.strip() or "Bot message (Unicode not supported)"
-    
-    return message
+    # bisect_left keeps each threshold inside its own bucket (3 days is still critical)
+    return _STATUS_EMOJIS[bisect.bisect_left(_STATUS_THRESHOLDS, days_until_expire)]
 
-def chunk_list(lst: list, chunk_size: int) -> list:
-    """Split list into chunks of specified size"""
-    return [lst[i:i + chunk_size] for i in range(0, len(lst), chunk_size)]
+def chunk_list(lst: Iterable, chunk_size: int) -> Iterator[list]:
+    """Yield chunks of specified size, one at a time"""
+    it = iter(lst)
+    while chunk := list(islice(it, chunk_size)):
+        yield chunk
 
 def is_user_authorized(user_id: str) -> bool:
     """Check if user is authorized to use bot commands"""
-    return str(user_id) in Config.AUTHORIZED_USERS
+    return str(user_id).isdigit() and int(user_id) in Config.AUTHORIZED_USERS
 
 class RateLimiter:
     """Simple rate limiter for API calls"""
     def __init__(self, max_calls: int = 10, time_window: int = 60):
         self.max_calls = max_calls
         self.time_window = time_window
-        self.calls = {}
+        # Per-identifier call times, oldest first, so expired calls are evicted from the left
+        self.calls = defaultdict(deque)
     
     def is_allowed(self, identifier: str) -> bool:
         """Check if call is allowed for identifier"""
-        now = datetime.now()
-        
-        if identifier not in self.calls:
-            self.calls[identifier] = []
+        # Monotonic seconds, unaffected by wall-clock jumps and gaps longer than a day
+        now = time.monotonic()
+        calls = self.calls[identifier]
         
         # Remove old calls outside time window
-        self.calls[identifier] = [
-            call_time for call_time in self.calls[identifier]
-            if (now - call_time).seconds < self.time_window
-        ]
+        while calls and now - calls[0] >= self.time_window:
+            calls.popleft()
         
         # Check if under limit
-        if len(self.calls[identifier]) < self.max_calls:
-            self.calls[identifier].append(now)
+        if len(calls) < self.max_calls:
+            calls.append(now)
             return True
         
         return False
 
+class AdaptiveTokenBucket:
+    """Token bucket whose refill rate adapts to the server: grows on success, halves when rate limited"""
+    def __init__(self, rate: float = 1.0, capacity: float = 5.0, min_rate: float = 0.05,
+                 max_rate: float = 2.5, increase: float = 0.1, decrease: float = 0.5):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = capacity
+        self._last_refill = time.monotonic()
+        # Created on first acquire so the lock belongs to the running loop
+        self._lock: Optional[asyncio.Lock] = None
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+    
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it, waiters are served in order"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+    
+    def increase_rate(self) -> None:
+        """Additively raise the rate after a successful request"""
+        self.rate = min(self.max_rate, self.rate + self.increase)
+    
+    def decrease_rate(self) -> None:
+        """Multiplicatively cut the rate and drain the bucket after being rate limited"""
+        self._refill()
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = 0.0
+
+# Cached in place of a value to record a confirmed absence, so callers can skip the lookup
+MISSING = object()
+
 class Cache:
-    """Simple in-memory cache"""
-    def __init__(self, default_ttl: int = 300):  # 5 minutes default
-        self.cache = {}
+    """Simple in-memory cache for use from the event loop thread"""
+    def __init__(self, default_ttl: int = 300, max_size: int = 1024):  # 5 minutes default
+        # Least recently used first, so the size cap evicts from the front
+        self.cache = OrderedDict()
         self.default_ttl = default_ttl
+        self.max_size = max_size
+        # (expiry, key) min-heap; entries superseded by a later set are skipped during cleanup
+        self._heap: List[Tuple[float, str]] = []
+        # No lock: every method runs to completion without awaiting, so coroutines can't interleave inside one
     
     def get(self, key: str) -> Optional[Any]:
-        """Get value from cache"""
-        if key in self.cache:
-            value, expiry = self.cache[key]
-            if datetime.now() < expiry:
-                return value
-            else:
-                del self.cache[key]
+        """Get value from cache, None if absent or MISSING for a cached absence"""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        
+        value, expiry = entry
+        if time.monotonic() < expiry:
+            self.cache.move_to_end(key)
+            return value
+        
+        del self.cache[key]
         return None
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Set value in cache"""
         ttl = ttl or self.default_ttl
-        expiry = datetime.now() + timedelta(seconds=ttl)
+        expiry = time.monotonic() + ttl
         self.cache[key] = (value, expiry)
+        self.cache.move_to_end(key)
+        heapq.heappush(self._heap, (expiry, key))
+        
+        if len(self.cache) > self.max_size:
+            self.cleanup()
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+        
+        # Overwrites and LRU evictions leave stale heap entries behind, rebuild before they pile up
+        if len(self._heap) > 2 * self.max_size:
+            self._heap = [(expiry, key) for key, (_, expiry) in self.cache.items()]
+            heapq.heapify(self._heap)
+    
+    def set_missing(self, key: str, ttl: int = 60) -> None:
+        """Remember that key has no value, for a shorter TTL than real values"""
+        self.set(key, MISSING, ttl)
     
     def clear(self) -> None:
         """Clear all cache"""
         self.cache.clear()
+        self._heap.clear()
     
     def cleanup(self) -> None:
         """Remove expired entries"""
-        now = datetime.now()
-        expired_keys = [
-            key for key, (_, expiry) in self.cache.items()
-            if now >= expiry
-        ]
-        for key in expired_keys:
-            del self.cache[key]
+        now = time.monotonic()
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expiry, key = heapq.heappop(heap)
+            entry = self.cache.get(key)
+            # Skip heap entries for keys that were since overwritten or evicted
+            if entry is not None and entry[1] == expiry:
+                del self.cache[key]
 
 # Global instances
 rate_limiter = RateLimiter()
@@ -303,6 +417,5 @@ async def safe_send_message(channel, *args, **kwargs):
     try:
         return await channel.send(*args, **kwargs)
     except Exception as e:
-        logger = logging.getLogger(__name__)
-        logger.error(f"❌ Failed to send message: {e}")
+        logger.error("❌ Failed to send message: %s", e)
         return None
\ No newline at end of file